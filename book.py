@@ -0,0 +1,118 @@
+"""
+Opening book for the placement phase: the best move of every position of the first plies of a game,
+found offline by a deep alpha_beta_cutoff_search. The searches in games.py play the book move when
+game.book has one for the position, and only search positions out of the book.
+
+Positions are keyed by their canonical form (symmetry.py), so one entry covers all the symmetric images of
+a position, and moves are stored in canonical orientation.
+
+To build a book of the positions of the first 4 plies searched 6 plies deep, on all cores:
+
+    python book.py --plies 4 --depth 6 --output book.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+from games import NMensMorris, BitboardState, alpha_beta_cutoff_search
+from symmetry import canonical_symmetry, transform_move, INVERSES
+
+
+class OpeningBook:
+    """Best moves of placement-phase positions, keyed by canonical position."""
+
+    def __init__(self, path=None):
+        self.moves = {}  # key: (start, end, captured) in canonical orientation
+        if path is not None:
+            with open(path) as f:
+                self.moves = {key: tuple(move) for key, move in json.load(f)['moves'].items()}
+
+    @staticmethod
+    def key(state):
+        """(key, s): the key of the BitboardState state and the symmetry taking it to its canonical form."""
+        s, x_bits, o_bits = canonical_symmetry(state.x_bits, state.o_bits)
+        return '{:06x} {:06x} {} {} {}'.format(x_bits, o_bits, state.x_hand, state.o_hand, state.to_move), s
+
+    def lookup(self, state):
+        """The book move of state, or None if state is not in the book."""
+        key, s = self.key(state)
+        move = self.moves.get(key)
+        return transform_move(move, INVERSES[s]) if move is not None else None
+
+    def add(self, state, move):
+        key, s = self.key(state)
+        self.moves[key] = transform_move(move, s)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'moves': self.moves}, f, sort_keys=True)
+
+    def __len__(self):
+        return len(self.moves)
+
+
+def book_positions(game, plies):
+    """One position of every canonical class reachable in fewer than plies plies from the start, as long
+    as the side to move still has pieces to place."""
+    positions = []
+    seen = set()
+    layer = [game.initial.copy()]
+    for _ in range(plies):
+        next_layer = []
+        for state in layer:
+            key, _ = OpeningBook.key(state)
+            if key in seen or not state.hand(state.to_move):
+                continue
+            seen.add(key)
+            positions.append(state)
+            for move in game.actions(state):
+                next_layer.append(game.result(state, move))
+        layer = next_layer
+    return positions
+
+
+def search_position(task):
+    """Search one position, given as (to_move, x_bits, o_bits, x_hand, o_hand, depth, time_budget), and
+    return (position, move)."""
+    to_move, x_bits, o_bits, x_hand, o_hand, depth, time_budget = task
+    state = BitboardState(to_move, x_bits, o_bits, x_hand, o_hand)
+    move = alpha_beta_cutoff_search(state, NMensMorris(), d=depth, time_budget=time_budget)
+    return task[:5], move
+
+
+def build(plies=4, depth=6, time_budget=60, workers=None, verbose=True):
+    """Search every position of book_positions(plies) depth plies deep, or for at most time_budget seconds,
+    on a pool of workers processes (all cores by default), and return the book of the moves found."""
+    game = NMensMorris()
+    tasks = [(state.to_move, state.x_bits, state.o_bits, state.x_hand, state.o_hand, depth, time_budget)
+             for state in book_positions(game, plies)]
+    if verbose:
+        print("{} positions to search".format(len(tasks)))
+
+    book = OpeningBook()
+    with multiprocessing.Pool(workers) as pool:
+        for position, move in pool.imap_unordered(search_position, tasks):
+            if move is not None:
+                book.add(BitboardState(*position), move)
+    return book
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an opening book for Nine Men's Morris.")
+    parser.add_argument('--plies', type=int, default=4, help="book the positions of the first plies plies")
+    parser.add_argument('--depth', type=int, default=6, help="cutoff depth of the search of each position")
+    parser.add_argument('--time', type=float, default=60, help="most seconds to search each position")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument('--output', default='book.json', help="file to write the book to")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    book = build(args.plies, args.depth, args.time, args.workers)
+    book.save(args.output)
+    print("{} positions booked in {:.1f} s".format(len(book), time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Asynchronous engine driver for the GUI: the search of an AI move runs in a separate process, so that the Tk
+main loop keeps handling events while the engine thinks.
+
+The GUI starts a search with EngineDriver.start and then polls the driver from root.after callbacks.
+poll() returns the messages the search sent since the last call: ('info', depth, move, score) after every
+completed iteration of the iterative deepening of AlphaBetaCutoff and PVS, and last ('done', move) with the
+move chosen, None if there is none. Moves are bitboard moves, see NMensMorris.to_coords. cancel() stops the
+search, for instance when a new game is started.
+"""
+
+import multiprocessing
+import queue
+import signal
+
+from games import NMensMorris, PlayerType, alpha_beta_cutoff_search, pvs_search, engine_move
+
+
+def _stop_search(signum, frame):
+    """SIGTERM handler of the engine process: take the processes of a parallel search down with it, and
+    end the search with SystemExit, so that it unwinds through its cleanup and frees the shared memory of
+    a SharedTranspositionTable."""
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    for child in multiprocessing.active_children():
+        child.terminate()
+    raise SystemExit(1)
+
+
+def search_process(messages, player_type, state, tablebase, book, weights, d, time_budget, workers, parallel):
+    """Body of the engine process: search state with the AI player of type player_type and put the
+    ('info', ...) and ('done', move) messages on the queue messages."""
+    signal.signal(signal.SIGTERM, _stop_search)
+    game = NMensMorris()
+    game.tablebase, game.book, game.weights = tablebase, book, weights
+
+    def on_iteration(depth, move, score):
+        messages.put(('info', depth, move, score))
+
+    if player_type == PlayerType[4]:
+        move = alpha_beta_cutoff_search(state, game, d=d, time_budget=time_budget, workers=workers,
+                                        parallel=parallel, on_iteration=on_iteration)
+    elif player_type == PlayerType[6]:
+        move = pvs_search(state, game, d=d, time_budget=time_budget, on_iteration=on_iteration)
+    else:
+        move = engine_move(player_type, game, state, d=d, time_budget=time_budget)
+    messages.put(('done', move))
+
+
+class EngineDriver:
+    """Runs one search at a time in a child process."""
+
+    def __init__(self):
+        self.process = None
+        self.messages = None
+
+    def start(self, player_type, state, game, d=-1, time_budget=5, workers=None, parallel='root'):
+        """Start searching the BitboardState state with the AI player of type player_type, using the
+        tablebase, book and evaluation weights of game. A search still running is cancelled."""
+        self.cancel()
+        self.messages = multiprocessing.Queue()
+        # not a daemon, so that it may start the processes of a parallel search
+        self.process = multiprocessing.Process(
+            target=search_process, args=(self.messages, player_type, state, game.tablebase, game.book,
+                                         game.weights, d, time_budget, workers, parallel))
+        self.process.start()
+
+    def busy(self):
+        """True while a search is running."""
+        return self.process is not None
+
+    def poll(self):
+        """The messages sent by the search since the last call, without waiting. A search process that
+        died without a move ends with ('done', None)."""
+        if self.process is None:
+            return []
+        alive = self.process.is_alive()
+        received = []
+        while True:
+            try:
+                received.append(self.messages.get_nowait())
+            except queue.Empty:
+                break
+        if received and received[-1][0] == 'done':
+            self.process.join()
+            self.process = None
+        elif not alive:
+            print("EngineDriver: the search process exited with code", self.process.exitcode)
+            self.process = None
+            received.append(('done', None))
+        return received
+
+    def cancel(self):
+        """Stop the running search, if any, and drop its messages."""
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+        self.messages = None
@@ -0,0 +1,249 @@
+"""
+Evaluation features of positions, computed incrementally for one position or vectorized for many at once.
+
+The feature counts of a BitboardState (feature_counts) are kept up to date by NMensMorris.make_move with
+update_features, which only looks at the few points and mills a move touches, so a static evaluation reads
+them in O(1) instead of scanning the board.
+
+The static value of a position is a linear combination of the features of FEATURES, X's count minus O's,
+with weights read from a JSON file of {feature: weight} (load_weights) and tuned offline by tune.py.
+
+For vectorized evaluation with NumPy, positions are given as arrays with one entry per position: x_bits
+and o_bits the bitboards of the two sides (see topology.py), x_hand and o_hand the pieces still to be
+placed, and x_to_move true where X is to move. The bitboards may be any sequence of ints, the others must
+be NumPy arrays. The points of the bitboards are unpacked into an (N, 24) array and the features are
+computed with a couple of matrix products against the neighbor and mill incidence matrices, so that the
+interpreter overhead is paid once per batch rather than once per position.
+"""
+
+import json
+
+import numpy as np
+
+from topology import POINTS, FULL_MASK, NEIGHBOR_MASKS, MILLS, MILL_MASKS, POINT_MILLS, popcount, bit_indices
+
+N_POINTS = len(POINTS)
+_SHIFTS = np.arange(N_POINTS, dtype=np.int64)
+
+# NEIGHBOR_MATRIX[p, q] is 1 if the points p and q are neighbors
+NEIGHBOR_MATRIX = np.array([[mask >> q & 1 for q in range(N_POINTS)] for mask in NEIGHBOR_MASKS], dtype=np.int16)
+# MILL_MATRIX[p, m] is 1 if point p is on mill m
+MILL_MATRIX = np.array([[int(p in mill) for mill in MILLS] for p in range(N_POINTS)], dtype=np.int16)
+
+FEATURES = ['material', 'mobility', 'open_mills', 'blocked', 'closed_mills']
+# Weights of FEATURES giving the original evaluation: 3 per piece of material plus the difference in moves
+DEFAULT_WEIGHTS = {'material': 3, 'mobility': 1, 'open_mills': 0, 'blocked': 0, 'closed_mills': 0}
+# Bound on the static value of an undecided position, below the 100 of a won one
+MAX_VALUE = 99
+
+# Indices into the feature counts of a BitboardState. X's count of each feature is at the index and O's
+# right after it: the moves (pairs of a piece and an empty neighbor), the pieces with no empty neighbor,
+# the complete mills and the open mills (two pieces and an empty point).
+MOVES, BLOCKED, CLOSED_MILLS, OPEN_MILLS = 0, 2, 4, 6
+N_COUNTS = 8
+
+
+def feature_counts(x_bits, o_bits):
+    """Feature counts of the position with bitboards x_bits and o_bits, computed from scratch."""
+    counts = [0] * N_COUNTS
+    empty = FULL_MASK & ~(x_bits | o_bits)
+    for side, own in ((0, x_bits), (1, o_bits)):
+        for p in bit_indices(own):
+            n = popcount(NEIGHBOR_MASKS[p] & empty)
+            counts[MOVES + side] += n
+            if not n:
+                counts[BLOCKED + side] += 1
+    for m in MILL_MASKS:
+        _count_mill(counts, m, x_bits, o_bits, 1)
+    return counts
+
+
+def state_features(state):
+    """Features of FEATURES of a BitboardState, X's value minus O's, from its feature counts. The pieces of
+    a side down to 3 fly anywhere, so its mobility and blocked pieces count as 0."""
+    counts = state.features
+    x_live, o_live = state.live_pieces('X'), state.live_pieces('O')
+    x_moves, x_blocked = (0, 0) if x_live == 3 and not state.x_hand else (counts[MOVES], counts[BLOCKED])
+    o_moves, o_blocked = (0, 0) if o_live == 3 and not state.o_hand else (counts[MOVES + 1], counts[BLOCKED + 1])
+    return [x_live - o_live,
+            x_moves - o_moves,
+            counts[OPEN_MILLS] - counts[OPEN_MILLS + 1],
+            x_blocked - o_blocked,
+            counts[CLOSED_MILLS] - counts[CLOSED_MILLS + 1]]
+
+
+def linear_value(features, weights):
+    """Integral value of a list of features given the list of their weights, in FEATURES order. Rounding
+    keeps scores integral, as the null windows of pvs_search need, and bounding them keeps them below the
+    value of a decided game."""
+    value = 0
+    for w, f in zip(weights, features):
+        value += w * f
+    return max(-MAX_VALUE, min(MAX_VALUE, round(value)))
+
+
+def load_weights(path=None):
+    """List of the weights of FEATURES, in order, from the JSON file path: the DEFAULT_WEIGHTS updated with
+    the weights it names. Without path, the DEFAULT_WEIGHTS."""
+    weights = dict(DEFAULT_WEIGHTS)
+    if path is not None:
+        with open(path) as f:
+            named = json.load(f)
+        unknown = set(named) - set(FEATURES)
+        if unknown:
+            raise ValueError("load_weights: unknown features " + ", ".join(sorted(unknown)))
+        weights.update(named)
+    return [weights[name] for name in FEATURES]
+
+
+def save_weights(weights, path):
+    """Write the list of weights of FEATURES to the JSON file path."""
+    with open(path, 'w') as f:
+        json.dump(dict(zip(FEATURES, weights)), f, indent=1)
+        f.write('\n')
+
+
+def _count_mill(counts, m, x_bits, o_bits, sign):
+    """Add sign times the contribution of mill m to the mill counts."""
+    x, o = x_bits & m, o_bits & m
+    if not o:
+        if x == m:
+            counts[CLOSED_MILLS] += sign
+        elif popcount(x) == 2:
+            counts[OPEN_MILLS] += sign
+    if not x:
+        if o == m:
+            counts[CLOSED_MILLS + 1] += sign
+        elif popcount(o) == 2:
+            counts[OPEN_MILLS + 1] += sign
+
+
+def _occupy(counts, point, side, x_bits, o_bits):
+    """Update counts for a piece of side (0 for X, 1 for O) arriving on the empty point, and return the
+    new (x_bits, o_bits)."""
+    occupied = x_bits | o_bits
+    empty = FULL_MASK & ~occupied
+    # the neighbors lose a move to point, and are blocked if it was their last one
+    for p in bit_indices(NEIGHBOR_MASKS[point] & occupied):
+        owner = 0 if x_bits >> p & 1 else 1
+        counts[MOVES + owner] -= 1
+        if popcount(NEIGHBOR_MASKS[p] & empty) == 1:
+            counts[BLOCKED + owner] += 1
+    n = popcount(NEIGHBOR_MASKS[point] & empty)
+    counts[MOVES + side] += n
+    if not n:
+        counts[BLOCKED + side] += 1
+
+    row, col = POINT_MILLS[point]
+    _count_mill(counts, row, x_bits, o_bits, -1)
+    _count_mill(counts, col, x_bits, o_bits, -1)
+    if side == 0:
+        x_bits |= 1 << point
+    else:
+        o_bits |= 1 << point
+    _count_mill(counts, row, x_bits, o_bits, 1)
+    _count_mill(counts, col, x_bits, o_bits, 1)
+    return x_bits, o_bits
+
+
+def _vacate(counts, point, side, x_bits, o_bits):
+    """Update counts for the piece of side leaving point, and return the new (x_bits, o_bits)."""
+    occupied = x_bits | o_bits
+    empty = FULL_MASK & ~occupied
+    n = popcount(NEIGHBOR_MASKS[point] & empty)
+    counts[MOVES + side] -= n
+    if not n:
+        counts[BLOCKED + side] -= 1
+    # the neighbors gain a move to point, and are no longer blocked if it is their first one
+    for p in bit_indices(NEIGHBOR_MASKS[point] & occupied):
+        owner = 0 if x_bits >> p & 1 else 1
+        counts[MOVES + owner] += 1
+        if not NEIGHBOR_MASKS[p] & empty:
+            counts[BLOCKED + owner] -= 1
+
+    row, col = POINT_MILLS[point]
+    _count_mill(counts, row, x_bits, o_bits, -1)
+    _count_mill(counts, col, x_bits, o_bits, -1)
+    if side == 0:
+        x_bits &= ~(1 << point)
+    else:
+        o_bits &= ~(1 << point)
+    _count_mill(counts, row, x_bits, o_bits, 1)
+    _count_mill(counts, col, x_bits, o_bits, 1)
+    return x_bits, o_bits
+
+
+def update_features(counts, move, side, x_bits, o_bits):
+    """Feature counts after side (0 for X, 1 for O) plays the (start, end, captured) move in the position
+    with bitboards x_bits and o_bits and feature counts counts. counts is left untouched, so the caller can
+    keep it to undo the move."""
+    start, end, captured = move
+    counts = counts[:]
+    if start >= 0:
+        x_bits, o_bits = _vacate(counts, start, side, x_bits, o_bits)
+    x_bits, o_bits = _occupy(counts, end, side, x_bits, o_bits)
+    if captured >= 0:
+        _vacate(counts, captured, 1 - side, x_bits, o_bits)
+    return counts
+
+
+def unpack(bits):
+    """(N, 24) int16 array of the points set in each bitboard of bits."""
+    return (np.asarray(bits, dtype=np.int64)[:, None] >> _SHIFTS & 1).astype(np.int16)
+
+
+def side_features(own, empty_neighbors, empty_mills, hand):
+    """Features of one side, given its unpacked pieces own, the number of empty neighbors of every point and
+    of empty points of every mill, and the pieces in hand: live pieces, moves (pairs of a piece and an empty
+    neighbor), mills missing only one piece on an empty point, pieces with no empty neighbor and complete
+    mills. A side down to 3 pieces flies and counts no moves and no blocked pieces, as in state_features."""
+    pieces = own.sum(axis=1)
+    own_mills = own @ MILL_MATRIX
+    sliding = (pieces + hand != 3) | (hand != 0)
+    return (pieces + hand,
+            (own * empty_neighbors).sum(axis=1) * sliding,
+            ((own_mills == 2) & (empty_mills == 1)).sum(axis=1),
+            (own * (empty_neighbors == 0)).sum(axis=1) * sliding,
+            (own_mills == 3).sum(axis=1))
+
+
+def batch_side_features(x_bits, o_bits, x_hand, o_hand):
+    """(x_features, o_features): the side_features of X and of O for each position."""
+    n = len(x_bits)
+    points = unpack(np.concatenate([x_bits, o_bits]))
+    x, o = points[:n], points[n:]
+    empty = 1 - x - o
+    empty_neighbors = empty @ NEIGHBOR_MATRIX
+    empty_mills = empty @ MILL_MATRIX
+    return (side_features(x, empty_neighbors, empty_mills, np.asarray(x_hand)),
+            side_features(o, empty_neighbors, empty_mills, np.asarray(o_hand)))
+
+
+def _difference(x_features, o_features):
+    return np.stack([xf - of for xf, of in zip(x_features, o_features)], axis=1)
+
+
+def batch_features(x_bits, o_bits, x_hand, o_hand):
+    """(N, 5) array of the features of FEATURES for each position, X's value minus O's."""
+    return _difference(*batch_side_features(x_bits, o_bits, x_hand, o_hand))
+
+
+def batch_utility(x_bits, o_bits, x_hand, o_hand, x_to_move, weights=None):
+    """NMensMorris.bitboard_utility of each position, as an int array: +-100 for a decided game, otherwise
+    the linear_value of its batch_features with the list of weights, the DEFAULT_WEIGHTS if None, all for
+    X."""
+    if weights is None:
+        weights = load_weights()
+    x_features, o_features = batch_side_features(x_bits, o_bits, x_hand, o_hand)
+    value = _difference(x_features, o_features) @ np.asarray(weights, dtype=float)
+    value = np.clip(np.rint(value), -MAX_VALUE, MAX_VALUE).astype(np.int64)
+
+    # the side to move loses when it has nothing to place and no move, and a side with 2 pieces has lost;
+    # a side down to 3 pieces flies, counts no moves and always has one
+    x_live, x_moves = x_features[:2]
+    o_live, o_moves = o_features[:2]
+    value[x_to_move & (x_hand == 0) & (x_moves == 0) & (x_live != 3)] = -100
+    value[~x_to_move & (o_hand == 0) & (o_moves == 0) & (o_live != 3)] = 100
+    value[o_live < 3] = 100
+    value[x_live < 3] = -100
+    return value
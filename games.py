@@ -1,9 +1,19 @@
-import copy
+import multiprocessing
 import random
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 import sys
 import time
+from topology import POINTS, POINT_INDEX, FULL_MASK, NEIGHBORS, popcount, to_mask, to_poses, \
+    closed_mills, removable
+from transposition import TranspositionTable, SharedTranspositionTable, zobrist_hash, EXACT, LOWERBOUND, \
+    UPPERBOUND
+from ordering import MoveOrderer, mill_moves
+from symmetry import canonical_key, transform_move, INVERSES
+from movegen import DESTINATIONS, flies, generate_moves, iter_steps
+from evaluation import batch_utility, feature_counts, update_features, state_features, linear_value, \
+    load_weights, MOVES
 
 sys.setrecursionlimit(2000)
 
@@ -14,7 +24,85 @@ GameState = namedtuple('GameState', 'to_move, utility, board, moves, player1, pl
 # Things from nMensMorrisGame.py that is used globally
 
 GameSteps = ['Setup', 'Move']
-PlayerType = ["Human", "Random", "MinMax", "AlphaBeta", "AlphaBetaCutoff", "ExpectimaxCutoff"]
+PlayerType = ["Human", "Random", "MinMax", "AlphaBeta", "AlphaBetaCutoff", "ExpectimaxCutoff", "PVS"]
+
+# Plies below its root past which no search looks, see NMensMorris.search_cutoff
+SEARCH_HORIZON = 20
+
+
+# ______________________________________________________________________________
+# Bitboard representation
+
+class BitboardState:
+    """Compact search state. Each side's pieces are packed into a 24-bit integer where bit i is set when the
+    side occupies POINTS[i]. x_hand and o_hand count the pieces each side still has to place; a side is in
+    the 'Setup' step while it has pieces in hand and in the 'Move' step afterwards. depth counts the plies
+    played since the root of the current search, and features are the feature counts of evaluation.py, kept
+    up to date by NMensMorris.make_move. make_move replaces features with a new list rather than changing
+    it, so copies may share it. A state hashes as the Zobrist hash of its position."""
+
+    __slots__ = ('to_move', 'x_bits', 'o_bits', 'x_hand', 'o_hand', 'depth', 'features')
+
+    def __init__(self, to_move='X', x_bits=0, o_bits=0, x_hand=9, o_hand=9, depth=0, features=None):
+        self.to_move = to_move
+        self.x_bits = x_bits
+        self.o_bits = o_bits
+        self.x_hand = x_hand
+        self.o_hand = o_hand
+        self.depth = depth
+        self.features = feature_counts(x_bits, o_bits) if features is None else features
+
+    def copy(self):
+        return BitboardState(self.to_move, self.x_bits, self.o_bits, self.x_hand, self.o_hand, self.depth,
+                             self.features)
+
+    def pieces(self, sym):
+        """Bitboards (own, opponent) from the point of view of sym."""
+        return (self.x_bits, self.o_bits) if sym == 'X' else (self.o_bits, self.x_bits)
+
+    def hand(self, sym):
+        return self.x_hand if sym == 'X' else self.o_hand
+
+    def live_pieces(self, sym):
+        """Pieces on the board plus pieces in hand, the same quantity as NMMPlayer.livePieces."""
+        if sym == 'X':
+            return popcount(self.x_bits) + self.x_hand
+        return popcount(self.o_bits) + self.o_hand
+
+    def __eq__(self, other):
+        return isinstance(other, BitboardState) and \
+            (self.to_move, self.x_bits, self.o_bits, self.x_hand, self.o_hand) == \
+            (other.to_move, other.x_bits, other.o_bits, other.x_hand, other.o_hand)
+
+    def __hash__(self):
+        return zobrist_hash(self.to_move, self.x_bits, self.o_bits, self.x_hand, self.o_hand)
+
+    def __repr__(self):
+        return 'BitboardState(to_move={!r}, x_bits={:#08x}, o_bits={:#08x}, x_hand={}, o_hand={}, depth={})'.format(
+            self.to_move, self.x_bits, self.o_bits, self.x_hand, self.o_hand, self.depth)
+
+
+# What make_move did to a BitboardState: the (start, end, captured) move played, the index of the opponent
+# piece it captured (-1 if none), and the feature counts of the position before the move.
+MoveRecord = namedtuple('MoveRecord', 'move, captured, features')
+
+
+def search_state(game, state):
+    """The searches below make and unmake moves in place on a BitboardState. Return a private copy of state
+    to search on, converting a GameState built by the GUI, and a function mapping the chosen move back into
+    the form the caller passed in."""
+    if isinstance(state, GameState):
+        return game.to_bitboard(state), lambda move: None if move is None else game.to_coords(move)
+    state = state.copy()
+    state.depth = 0
+    return state, lambda move: move
+
+
+def book_move(game, state):
+    """The move the opening book game.book gives for the BitboardState state, or None if no book is
+    loaded or state is not in it."""
+    book = getattr(game, 'book', None)
+    return book.lookup(state) if book is not None else None
 
 
 def gen_state(to_move='X', x_positions=[], o_positions=[], h=3, v=3):
@@ -42,23 +130,26 @@ def minmax_decision(state, game):
     forward all the way to the terminal states."""
 
     player = game.to_move(state)
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
 
     def max_value(state2, end):
         v = 0
         if time.time() > end:
             return v
 
-        if game.terminal_test(state2):
+        if game.search_cutoff(state2):
             return game.utility(state2, player)
 
         v = -np.inf
-        saved_state = copy.deepcopy(state2)
         for a in game.actions(state2):
             if time.time() > end:
                 return v
-            time.sleep(0.001)
-            state2 = copy.deepcopy(saved_state)
-            v = max(v, min_value(game.result(state2, a, end), end))
+            undo = game.make_move(state2, a)
+            v = max(v, min_value(state2, end))
+            game.unmake_move(state2, undo)
             if time.time() > end:
                 return v
 
@@ -69,27 +160,32 @@ def minmax_decision(state, game):
         if time.time() > end:
             return v
 
-        if game.terminal_test(state3):
+        if game.search_cutoff(state3):
             return game.utility(state3, player)
 
         v = np.inf
-        saved_state = copy.deepcopy(state3)
         for a in game.actions(state3):
             if time.time() > end:
                 return v
-            time.sleep(0.001)
-            state3 = copy.deepcopy(saved_state)
-            v = min(v, max_value(game.result(state3, a, end), end))
+            undo = game.make_move(state3, a)
+            v = min(v, max_value(state3, end))
+            game.unmake_move(state3, undo)
             if time.time() > end:
                 return v
 
         return v
 
+    def root_value(a):
+        undo = game.make_move(state, a)
+        v = min_value(state, end)
+        game.unmake_move(state, undo)
+        return v
+
     start = time.time()
     end = start + 5
 
     # Body of minmax_decision:
-    return max(game.actions(state), key=lambda a: min_value(game.result(state, a, end), end))
+    return to_caller(max(game.actions(state), key=root_value, default=None))
 
 
 # ______________________________________________________________________________
@@ -101,61 +197,56 @@ def expect_minmax(state, game, d=4):
 	"""
 
     player = game.to_move(state)
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
 
     def max_value(state5, depth, end8):
-        v = 0
-        if time.time() > end8 or depth >= d:
-            return v
+        if time.time() > end8 or depth >= d or game.search_cutoff(state5):
+            return game.utility(state5, player)
 
         v = -np.inf
-        saved_state6 = copy.deepcopy(state5)
-        for a in game.actions(state):
-
-            state5 = copy.deepcopy(saved_state6)
+        for a in game.actions(state5):
             v = max(v, chance_node(state5, a,  depth + 1, end8))
         return v
 
 
 
     def min_value(state14, depth, end8):
-        v = 0
-        if time.time() > end8 or depth >= d:
-            return v
+        if time.time() > end8 or depth >= d or game.search_cutoff(state14):
+            return game.utility(state14, player)
 
-        v = -np.inf
-        saved_state6 = copy.deepcopy(state14)
+        v = np.inf
         for a in game.actions(state14):
-
-            state14 = copy.deepcopy(saved_state6)
             v = min(v, chance_node(state14, a,  depth + 1, end8))
         return v
 
 
     def chance_node(state9, action, depth, end8):
-        v = 0
-        if time.time() > end8 or depth >= d:
+        undo = game.make_move(state9, action)
+        if time.time() > end8 or depth >= d or game.search_cutoff(state9):
+            v = game.utility(state9, player)
+            game.unmake_move(state9, undo)
             return v
 
-        res_state = game.result(state9, action, end8)
-        if game.terminal_test(res_state):
-            return game.utility(res_state, player)
-
         sum_chances = 0
-        num_chances = len(game.actions(res_state))
+        chances = game.actions(state9)
 
-        for chance in game.actions(res_state):
-            if time.time() > end8 or depth == d:
-                return sum_chances / num_chances
+        for chance in chances:
+            if time.time() > end8:
+                break
 
-            res_state = game.result(res_state, chance, end8)
-
-            util = 0
-            if res_state.to_move == player:
-                util = max_value(res_state, depth+1, end8)
+            undo_chance = game.make_move(state9, chance)
+            if state9.to_move == player:
+                util = max_value(state9, depth+1, end8)
             else:
-                util = min_value(res_state, depth+1, end8)
+                util = min_value(state9, depth+1, end8)
+            game.unmake_move(state9, undo_chance)
             sum_chances += util
-        return sum_chances / num_chances
+
+        game.unmake_move(state9, undo)
+        return sum_chances / len(chances)
 
     start = time.time()
     end8 = start + 5
@@ -164,13 +255,17 @@ def expect_minmax(state, game, d=4):
         d = 4
 
     # Body of expect_minmax:
-    return max(game.actions(state), key=lambda a: chance_node(state, a, 1, end8), default=None)
+    return to_caller(max(game.actions(state), key=lambda a: chance_node(state, a, 1, end8), default=None))
 
 
 def alpha_beta_search(state, game):
     """Search game to determine best action; use alpha-beta pruning, this version searches all the way to the leaves."""
 
     player = game.to_move(state)
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
 
     # Functions used by alpha_beta
     def max_value(state2, alpha, beta, end2):
@@ -178,17 +273,19 @@ def alpha_beta_search(state, game):
         if time.time() > end2:
             return v
 
-        if game.terminal_test(state2):
+        if game.search_cutoff(state2):
             return game.utility(state2, player)
         v = -np.inf
 
-        saved_state2 = copy.deepcopy(state2)
-        for a in game.actions(state):
+        ply = state2.depth - root_depth
+        for a in orderer.order(state2, game.actions(state2), ply):
             if time.time() > end2:
                 return v
-            state2 = copy.deepcopy(saved_state2)
-            v = max(v, min_value(game.result(state2, a, end2), alpha, beta, end2))
+            undo = game.make_move(state2, a)
+            v = max(v, min_value(state2, alpha, beta, end2))
+            game.unmake_move(state2, undo)
             if v >= beta:
+                orderer.cutoff(state2, a, ply, 1)
                 return v
             alpha = max(alpha, v)
         return v
@@ -198,21 +295,21 @@ def alpha_beta_search(state, game):
         if time.time() > end2:
             return v
 
-        if game.terminal_test(state3):
+        if game.search_cutoff(state3):
             return game.utility(state3, player)
 
         v = np.inf
-        saved_state1 = copy.deepcopy(state3)
-        for a in game.actions(state3):
+        ply = state3.depth - root_depth
+        for a in orderer.order(state3, game.actions(state3), ply):
             if time.time() > end2:
                 return v
 
-            time.sleep(0.001)
-
-            state3 = copy.deepcopy(saved_state1)
-            v = min(v, max_value(game.result(state3, a, end2), alpha, beta, end2))
+            undo = game.make_move(state3, a)
+            v = min(v, max_value(state3, alpha, beta, end2))
+            game.unmake_move(state3, undo)
 
             if v <= alpha:
+                orderer.cutoff(state3, a, ply, 1)
                 return v
             beta = min(beta, v)
         return v
@@ -222,91 +319,636 @@ def alpha_beta_search(state, game):
     start = time.time()
     end2 = start + 5
 
+    orderer = MoveOrderer()
+    root_depth = state.depth
     best_score = -np.inf
     beta = np.inf
     best_action = None
-    saved_state = copy.deepcopy(state)
-    for a in game.actions(state):
+    for a in orderer.order(state, game.actions(state), 0):
         if time.time() > end2:
-            return best_action
-        state = copy.deepcopy(saved_state)
-        v = min_value(game.result(state, a, end2), best_score, beta, end2)
+            return to_caller(best_action)
+        undo = game.make_move(state, a)
+        v = min_value(state, best_score, beta, end2)
+        game.unmake_move(state, undo)
         if v > best_score:
             best_score = v
             best_action = a
-    return best_action
+    return to_caller(best_action)
+
+
+class SearchTimeout(Exception):
+    """Raised by TimeManager.tick to abandon a search whose budget is spent."""
+
+
+class TimeManager:
+    """Budget of one search: time_budget seconds of wall-clock time and, if node_limit is given, at most
+    that many nodes. The search calls tick() at every node, and tick raises SearchTimeout once either limit
+    is exceeded. A node limit makes a search reproducible regardless of machine speed."""
+
+    def __init__(self, time_budget=5, node_limit=None):
+        self.start = time.time()
+        self.end = self.start + time_budget
+        self.node_limit = node_limit
+        self.nodes = 0
+
+    def tick(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if time.time() > self.end:
+            raise SearchTimeout()
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def remaining(self):
+        return self.end - time.time()
+
 
+def quiescence_search(game, state, alpha, beta, evaluate, node_budget, tm=None):
+    """Value of state for its side to move, past the cutoff depth of a search, within (alpha, beta). The
+    side to move either stands on evaluate(state), the static value of state for it, or plays a move that
+    closes or blocks a mill; the search goes on through such moves until the position is quiet, so that a
+    mill about to be closed is not missed at the horizon. Once node_budget moves are searched, positions
+    count at their static value. tm, if given, is ticked at every node."""
+    nodes = 0
 
-def alpha_beta_cutoff_search(state, game, d=4, cutoff_test=None, eval_fn=None):
+    def search(alpha, beta):
+        nonlocal nodes
+        if tm is not None:
+            tm.tick()
+        v = evaluate(state)
+        if v >= beta or nodes >= node_budget or game.search_cutoff(state):
+            return v
+        alpha = max(alpha, v)
+        for a in mill_moves(state, game.actions(state)):
+            nodes += 1
+            undo = game.make_move(state, a)
+            child = -search(-beta, -alpha)
+            game.unmake_move(state, undo)
+            v = max(v, child)
+            if v >= beta or nodes >= node_budget:
+                break
+            alpha = max(alpha, v)
+        return v
+
+    return search(alpha, beta)
+
+
+def alpha_beta_cutoff_search(state, game, d=4, cutoff_test=None, eval_fn=None, tt=None, time_budget=5,
+                             node_limit=None, quiescence=32, batch=False, workers=None, parallel='root',
+                             root_moves=None, alpha=-np.inf, on_iteration=None, start_depth=1):
     """Search game to determine best action; use alpha-beta pruning.
-    This version cuts off search and uses an evaluation function."""
+    This version cuts off search and uses an evaluation function.
+    The search is iteratively deepened to cutoff depths start_depth, start_depth + 1, ... d, and the move
+    returned is the best move of the deepest iteration completed within time_budget seconds and node_limit
+    nodes; an iteration that runs out of budget is discarded. Moves are searched in the order given by a
+    MoveOrderer. Results are kept in the transposition table tt, a new one unless one is passed in, so that
+    positions reached again through a different move order or in a later iteration are not searched twice.
+    They are keyed by the canonical form of the position, so that symmetric positions share them too.
+    Positions covered by game.tablebase take their exact value from it. Past the cutoff depth, a quiescence
+    search of at most quiescence nodes per leaf follows the moves that close or block a mill, 0 evaluates
+    the leaves as they are. With batch, the nodes one ply above the cutoff depth score all their children
+    at once with evaluation.batch_utility, the same values as game.utility, in place of the quiescence
+    search, the tablebase and eval_fn.
+
+    With workers, the search runs on that many processes instead: with parallel 'root' they split the root
+    moves (parallel_root_search), with parallel 'smp' they all search the whole tree (lazy_smp_search). They
+    search with the same quiescence and batch, and share tt, which must then be a SharedTranspositionTable.
+    root_moves restricts the search to those root moves, and alpha is a lower bound on the score of the
+    root: moves that cannot beat it are not searched exactly. on_iteration(depth_limit, move, score) is
+    called after every completed iteration with its best move and score, move being None when no root
+    move beats alpha."""
 
     player = game.to_move(state)
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
+    if workers:
+        if tt is not None and not isinstance(tt, SharedTranspositionTable):
+            raise ValueError("alpha_beta_cutoff_search: the tt of a search with workers must be a "
+                             "SharedTranspositionTable")
+        if parallel == 'smp':
+            return to_caller(lazy_smp_search(state, game, d, cutoff_test, eval_fn, tt, time_budget, node_limit,
+                                             workers, quiescence, batch, on_iteration))
+        return to_caller(parallel_root_search(state, game, d, cutoff_test, eval_fn, tt, time_budget, node_limit,
+                                              workers, quiescence, batch, on_iteration))
+    tablebase = getattr(game, 'tablebase', None)
+
+    def tb_value(state1):
+        """Score of state1 for player from the tablebase, or None if it does not cover state1. A win in n
+        plies scores 100 - n, so that it ranks with the utility of 100 of a won position, and at least 1, so
+        that a win beyond 99 plies still counts as one."""
+        if tablebase is None:
+            return None
+        found = tablebase.probe(state1)
+        if found is None:
+            return None
+        result, distance = found  # result is 1, 0 or -1 for a win, draw or loss of the side to move
+        score = result * max(100 - distance, 1)
+        return score if state1.to_move == player else -score
+
+    def leaf_value(state1, alpha, beta):
+        """Score of state1, cut off, for player: its static value, or its quiescence search value."""
+        if not quiescence or game.search_cutoff(state1):
+            return eval_fn(state1)
+        if state1.to_move == player:
+            return quiescence_search(game, state1, alpha, beta, side_value, quiescence, tm)
+        return -quiescence_search(game, state1, -beta, -alpha, side_value, quiescence, tm)
+
+    def side_value(state1):
+        """Static value of state1 for its side to move."""
+        v = eval_fn(state1)
+        return v if state1.to_move == player else -v
+
+    def frontier_value(state1, best):
+        """(score, move) of the best child of state1 for player when best is np.argmax, for the opponent
+        when it is np.argmin, the children being scored in one batch."""
+        moves = game.actions(state1)
+        values = batch_utility(*game.batch_children(state1, moves), game.weights)
+        if player != 'X':
+            values = -values
+        i = best(values)
+        return int(values[i]), moves[i]
+
+    def tt_lookup(state1, key, alpha, beta, depth):
+        """Score stored under key, the canonical key of state1, by a search at least as deep as this one
+        that settles the node within (alpha, beta), or None. The table keeps scores from the point of view
+        of the side to move, the search from the point of view of player."""
+        entry = tt.probe(key)
+        if entry is None or entry[1] < depth_limit - depth:
+            return None
+        score, flag = entry[2], entry[3]
+        if state1.to_move != player:
+            score = -score
+            flag = UPPERBOUND if flag == LOWERBOUND else LOWERBOUND if flag == UPPERBOUND else EXACT
+        if flag == EXACT or (flag == LOWERBOUND and score >= beta) or (flag == UPPERBOUND and score <= alpha):
+            return score
+        return None
+
+    def tt_move(key, s):
+        """The best move stored under key, turned from canonical orientation back by symmetry s, searched
+        first."""
+        entry = tt.probe(key)
+        if entry is None or entry[4] is None:
+            return None
+        return transform_move(entry[4], INVERSES[s])
+
+    def tt_store(state1, key, s, alpha, beta, depth, v, best_move):
+        flag = LOWERBOUND if v >= beta else UPPERBOUND if v <= alpha else EXACT
+        if state1.to_move != player:
+            v = -v
+            flag = UPPERBOUND if flag == LOWERBOUND else LOWERBOUND if flag == UPPERBOUND else EXACT
+        if best_move is not None:
+            best_move = transform_move(best_move, s)
+        tt.store(key, depth_limit - depth, v, flag, best_move)
 
     # Functions used by alpha_beta
-    def max_value(state2, alpha, beta, depth, end3):
-        v = 0
-        if time.time() > end3:
+    def max_value(state2, alpha, beta, depth):
+        tm.tick()
+        v = tb_value(state2)
+        if v is not None:
             return v
         if cutoff_test(state2, depth):
-            return eval_fn(state2)
+            return leaf_value(state2, alpha, beta)
+        key, s = canonical_key(state2)
+        v = tt_lookup(state2, key, alpha, beta, depth)
+        if v is not None:
+            return v
+        if batch and depth == depth_limit:
+            v, best_move = frontier_value(state2, np.argmax)
+            tt_store(state2, key, s, alpha, beta, depth, v, best_move)
+            return v
+
+        alpha0 = alpha
         v = -np.inf
-        saved_state4 = copy.deepcopy(state2)
-        for a in game.actions(state2):
-            if time.time() > end3:
-                return v
-            state2 = copy.deepcopy(saved_state4)
-            v = max(v, min_value(game.result(state2, a, end3), alpha, beta, depth + 1, end3))
+        best_move = None
+        for a in orderer.order(state2, game.actions(state2), depth, tt_move(key, s)):
+            undo = game.make_move(state2, a)
+            child = min_value(state2, alpha, beta, depth + 1)
+            game.unmake_move(state2, undo)
+            if child > v:
+                v, best_move = child, a
             if v >= beta:
-                return v
+                orderer.cutoff(state2, a, depth, depth_limit - depth)
+                break
             alpha = max(alpha, v)
+
+        tt_store(state2, key, s, alpha0, beta, depth, v, best_move)
         return v
 
-    def min_value(state3, alpha, beta, depth, end3):
-        v = 0
-        if time.time() > end3:
+    def min_value(state3, alpha, beta, depth):
+        tm.tick()
+        v = tb_value(state3)
+        if v is not None:
             return v
         if cutoff_test(state3, depth):
-            return eval_fn(state3)
-        v = np.inf
+            return leaf_value(state3, alpha, beta)
+        key, s = canonical_key(state3)
+        v = tt_lookup(state3, key, alpha, beta, depth)
+        if v is not None:
+            return v
+        if batch and depth == depth_limit:
+            v, best_move = frontier_value(state3, np.argmin)
+            tt_store(state3, key, s, alpha, beta, depth, v, best_move)
+            return v
 
-        saved_state5 = copy.deepcopy(state3)
-        for a in game.actions(state3):
-            if time.time() > end3:
-                return v
-            time.sleep(0.001)
-            state3 = copy.deepcopy(saved_state5)
-            v = min(v, max_value(game.result(state3, a, end3), alpha, beta, depth + 1, end3))
+        beta0 = beta
+        v = np.inf
+        best_move = None
+        for a in orderer.order(state3, game.actions(state3), depth, tt_move(key, s)):
+            undo = game.make_move(state3, a)
+            child = max_value(state3, alpha, beta, depth + 1)
+            game.unmake_move(state3, undo)
+            if child < v:
+                v, best_move = child, a
 
             if v <= alpha:
-                return v
+                orderer.cutoff(state3, a, depth, depth_limit - depth)
+                break
             beta = min(beta, v)
+
+        tt_store(state3, key, s, alpha, beta0, depth, v, best_move)
         return v
 
+    def root_search(moves):
+        """One iteration: the best of moves and its score at the current depth_limit, or None and alpha if
+        no move beats alpha."""
+        best_score = alpha
+        best_action = None
+        for a in moves:
+            undo = game.make_move(state, a)
+            v = min_value(state, best_score, np.inf, 1)
+            game.unmake_move(state, undo)
+            if v > best_score:
+                best_score = v
+                best_action = a
+        if root_moves is None:
+            tt_store(state, root_key, root_s, alpha, np.inf, 0, best_score, best_action)
+        return best_action, best_score
+
     # Body of alpha_beta_cutoff_search starts here:
-    # The default test cuts off at depth d or at a terminal state
+    # The default test cuts off at depth depth_limit or at a terminal state
 
-    start = time.time()
-    end3 = start + 5
+    if d == -1:
+        d = 4
+
+    if tt is None:
+        tt = TranspositionTable()
+
+    tm = TimeManager(time_budget, node_limit)
+    orderer = MoveOrderer()
+    cutoff_test = (cutoff_test or (lambda state, depth: depth > depth_limit or game.search_cutoff(state)))
+    eval_fn = eval_fn or (lambda state: game.utility(state, player))
+
+    root_key, root_s = canonical_key(state)
+    moves = orderer.order(state, game.actions(state) if root_moves is None else root_moves, 0,
+                          tt_move(root_key, root_s))
+    if not moves:
+        return None
+    best_action = moves[0]
+    for depth_limit in range(start_depth, d + 1):
+        iteration_start = time.time()
+        try:
+            action, score = root_search(moves)
+        except SearchTimeout:
+            break
+        if on_iteration is not None:
+            on_iteration(depth_limit, action, score)
+        if action is not None:
+            # the next iteration searches the best move first
+            best_action = action
+            moves.remove(best_action)
+            moves.insert(0, best_action)
+        # and takes longer than this one did
+        if tm.remaining() < time.time() - iteration_start:
+            break
+
+    return to_caller(best_action)
+
+
+# ______________________________________________________________________________
+# Parallel root search
+
+# State of a search worker process, set by _init_search_worker
+_worker_game = None
+_worker_options = None
+_worker_tt = None
+_worker_alpha = None
+
+
+def _init_search_worker(game, options, alpha=None, tt=None):
+    """Set up a worker process: options are the keyword arguments of its alpha_beta_cutoff_search calls, the
+    cutoff_test, eval_fn, quiescence and batch of the search, and the transposition table is its own unless
+    a shared one is given."""
+    global _worker_game, _worker_options, _worker_tt, _worker_alpha
+    _worker_game = game
+    _worker_game.book = None
+    _worker_options = options
+    _worker_tt = tt if tt is not None else TranspositionTable()
+    _worker_alpha = alpha
+
+
+def _search_root_move(task):
+    """Search one root move in a worker: task is (state, move, depth_limit, deadline, node_limit). The move
+    is searched to depth_limit only, parallel_root_search doing the iterative deepening. Return (score,
+    exact), exact being False when the move cannot beat the bound shared by the workers and score is only
+    an upper bound, or None when the deadline or node_limit is reached first."""
+    state, move, depth_limit, deadline, node_limit = task
+    # a move equal to the best found so far is still searched exactly, so that ties are settled by the
+    # order of the moves and not by which worker finishes first
+    alpha = np.nextafter(_worker_alpha.value, -np.inf)
+    iterations = []
+    alpha_beta_cutoff_search(state, _worker_game, d=depth_limit, tt=_worker_tt, time_budget=deadline - time.time(),
+                             node_limit=node_limit, root_moves=[move], alpha=alpha, start_depth=depth_limit,
+                             on_iteration=lambda depth, action, score: iterations.append((depth, action, score)),
+                             **_worker_options)
+    if not iterations:
+        return None
+    _, action, score = iterations[-1]
+    if action is None:
+        return score, False
+    with _worker_alpha.get_lock():
+        if score > _worker_alpha.value:
+            _worker_alpha.value = score
+    return score, True
+
+
+def parallel_root_search(state, game, d=4, cutoff_test=None, eval_fn=None, tt=None, time_budget=5,
+                         node_limit=None, workers=None, quiescence=32, batch=False, on_iteration=None):
+    """alpha_beta_cutoff_search with the root moves split over a pool of workers processes (all cores by
+    default). The search is iteratively deepened like alpha_beta_cutoff_search; in each iteration every
+    root move is searched to the depth of the iteration by one worker. The workers share a
+    SharedTranspositionTable, so that the best moves stored by the shallower iterations order the deeper
+    ones: tt if one is passed in, a new one for this search otherwise. The first move, the best of the last
+    iteration, is searched alone, and the workers share the best score found so far in the iteration as the
+    alpha bound of the moves they start. The best move is the one with the best score, the first in the move
+    order among equal scores, whichever worker finishes first. node_limit limits the search of each root
+    move, and cutoff_test and eval_fn must be picklable when processes are not forked. quiescence and batch
+    are those of alpha_beta_cutoff_search, and on_iteration is called after every iteration completed, as in
+    alpha_beta_cutoff_search."""
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
+    if d == -1:
+        d = 4
 
+    moves = MoveOrderer().order(state, game.actions(state), 0)
+    if not moves:
+        return None
+    tm = TimeManager(time_budget)
+    alpha = multiprocessing.Value('d', -np.inf)
+    shared = tt if tt is not None else SharedTranspositionTable()
+    options = dict(cutoff_test=cutoff_test, eval_fn=eval_fn, quiescence=quiescence, batch=batch)
+    best_action = moves[0]
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_search_worker,
+                                 initargs=(game, options, alpha, shared)) as executor:
+            for depth_limit in range(1, d + 1):
+                iteration_start = time.time()
+                alpha.value = -np.inf
+                tasks = [(state, move, depth_limit, tm.end, node_limit) for move in moves]
+                # the first move, the best of the last iteration, is searched alone, so that the others
+                # start with its score as their bound
+                results = [executor.submit(_search_root_move, tasks[0]).result()]
+                if results[0] is not None:
+                    results.extend(executor.map(_search_root_move, tasks[1:]))
+                if None in results:
+                    break
+                best = max((i for i, (score, exact) in enumerate(results) if exact),
+                           key=lambda i: (results[i][0], -i))
+                best_action = moves[best]
+                if on_iteration is not None:
+                    on_iteration(depth_limit, best_action, results[best][0])
+                moves.remove(best_action)
+                moves.insert(0, best_action)
+                if tm.remaining() < time.time() - iteration_start:
+                    break
+    finally:
+        if tt is None:
+            shared.close()
+
+    return to_caller(best_action)
+
+
+def _lazy_smp_worker(task):
+    """Search the root in a worker: task is (state, index, d, deadline, node_limit). Worker 0 searches like
+    alpha_beta_cutoff_search, the others one ply deeper every other worker and with the root moves in a
+    different order. Return (depth, move, score) of the last iteration completed, or None."""
+    state, index, d, deadline, node_limit = task
+    root_moves = None
+    if index:
+        d += index % 2
+        root_moves = _worker_game.actions(state)
+        random.Random(index).shuffle(root_moves)
+    iterations = []
+    alpha_beta_cutoff_search(state, _worker_game, d=d, tt=_worker_tt, time_budget=deadline - time.time(),
+                             node_limit=node_limit, root_moves=root_moves,
+                             on_iteration=lambda depth, action, score: iterations.append((depth, action, score)),
+                             **_worker_options)
+    return iterations[-1] if iterations else None
+
+
+def lazy_smp_search(state, game, d=4, cutoff_test=None, eval_fn=None, tt=None, time_budget=5, node_limit=None,
+                    workers=None, quiescence=32, batch=False, on_iteration=None):
+    """alpha_beta_cutoff_search run by workers processes at once (all cores by default), all on the whole
+    tree, sharing one SharedTranspositionTable. What one worker stores the others find, so together they
+    search deeper than one alone; varying the depth and root move order between workers keeps them from
+    all searching the same nodes at the same time. The move returned is the best move of the deepest
+    iteration any worker completed, of the lowest numbered worker among those. tt is a
+    SharedTranspositionTable to use, a new one for this search unless one is passed in; node_limit limits
+    each worker, and quiescence and batch are those of alpha_beta_cutoff_search. on_iteration(depth_limit,
+    move, score) is called with the last iteration completed by each worker, as the workers finish."""
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
     if d == -1:
         d = 4
+    if not game.actions(state):
+        return None
+
+    workers = workers or multiprocessing.cpu_count()
+    shared = tt if tt is not None else SharedTranspositionTable()
+    deadline = time.time() + time_budget
+    options = dict(cutoff_test=cutoff_test, eval_fn=eval_fn, quiescence=quiescence, batch=batch)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_search_worker,
+                                 initargs=(game, options, None, shared)) as executor:
+            futures = {executor.submit(_lazy_smp_worker, (state, i, d, deadline, node_limit)): i
+                       for i in range(workers)}
+            completed = []
+            for future in as_completed(futures):
+                result = future.result()
+                if result is None or result[1] is None:
+                    continue
+                completed.append((result[0], -futures[future], result[1]))
+                if on_iteration is not None:
+                    on_iteration(*result)
+    finally:
+        if tt is None:
+            shared.close()
+
+    if not completed:
+        return to_caller(game.actions(state)[0])
+    return to_caller(max(completed)[2])
+
+
+# ______________________________________________________________________________
+# Principal variation search
 
-    cutoff_test = (cutoff_test or (lambda state, depth: depth > d or game.terminal_test(state)))
+
+def pvs_search(state, game, d=4, eval_fn=None, tt=None, time_budget=5, node_limit=None, quiescence=32,
+               window=10, on_iteration=None):
+    """Principal variation search (NegaScout): alpha_beta_cutoff_search in negamax form, every score being
+    from the point of view of the side to move. The first move of a node, the best one if the ordering is
+    right, is searched with the full window; every other move is first searched with a null window just
+    to prove it is no better, and searched again with the full window only when it turns out to be.
+    Each iteration of the iterative deepening starts with an aspiration window of window points around
+    the score of the previous one, and searches again with the window opened on the side it fails. Scores
+    are integers, as given by game.utility or eval_fn(state), the value of state for the player to move at
+    the root. Cutoff depth, budget, quiescence search, book, tablebase, transposition table and move
+    ordering are the same as in alpha_beta_cutoff_search."""
+
+    player = game.to_move(state)
+    state, to_caller = search_state(game, state)
+    move = book_move(game, state)
+    if move is not None:
+        return to_caller(move)
+    tablebase = getattr(game, 'tablebase', None)
     eval_fn = eval_fn or (lambda state: game.utility(state, player))
-    best_score = -np.inf
-    beta = np.inf
-    best_action = None
-    saved_state = copy.deepcopy(state)
-    for a in game.actions(state):
-        if time.time() > end3:
-            return best_action
-        state = copy.deepcopy(saved_state)
-        v = min_value(game.result(state, a, end3), best_score, beta, 1, end3)
-        if v > best_score:
-            best_score = v
-            best_action = a
-    return best_action
+
+    def tb_score(state1):
+        """Score of state1 for its side to move from the tablebase, or None if it does not cover state1."""
+        found = tablebase.probe(state1) if tablebase is not None else None
+        if found is None:
+            return None
+        result, distance = found
+        return result * max(100 - distance, 1)
+
+    def evaluate(state1):
+        """Static value of state1 for its side to move."""
+        v = eval_fn(state1)
+        return v if state1.to_move == player else -v
+
+    def pvs(state1, alpha, beta, depth):
+        """Value of state1 for its side to move, fail-soft within (alpha, beta)."""
+        tm.tick()
+        v = tb_score(state1)
+        if v is not None:
+            return v
+        if game.search_cutoff(state1):
+            return evaluate(state1)
+        if depth > depth_limit:
+            if quiescence:
+                return quiescence_search(game, state1, alpha, beta, evaluate, quiescence, tm)
+            return evaluate(state1)
+
+        key, s = canonical_key(state1)
+        entry = tt.probe(key)
+        best_move = None
+        if entry is not None:
+            if entry[4] is not None:
+                best_move = transform_move(entry[4], INVERSES[s])
+            if entry[1] >= depth_limit - depth:
+                score, flag = entry[2], entry[3]
+                if flag == EXACT or (flag == LOWERBOUND and score >= beta) or \
+                        (flag == UPPERBOUND and score <= alpha):
+                    return score
+
+        alpha0 = alpha
+        v = -np.inf
+        for i, a in enumerate(orderer.order(state1, game.actions(state1), depth, best_move)):
+            undo = game.make_move(state1, a)
+            if i == 0:
+                child = -pvs(state1, -beta, -alpha, depth + 1)
+            else:
+                child = -pvs(state1, -alpha - 1, -alpha, depth + 1)
+                if alpha < child < beta:
+                    child = -pvs(state1, -beta, -alpha, depth + 1)
+            game.unmake_move(state1, undo)
+            if child > v:
+                v, best_move = child, a
+            if v > alpha:
+                alpha = v
+            if alpha >= beta:
+                orderer.cutoff(state1, a, depth, depth_limit - depth)
+                break
+
+        flag = UPPERBOUND if v <= alpha0 else LOWERBOUND if v >= beta else EXACT
+        tt.store(key, depth_limit - depth, v, flag, None if best_move is None else transform_move(best_move, s))
+        return v
+
+    def root_search(moves, alpha, beta):
+        """One pass over the root moves within (alpha, beta): the best move and its score."""
+        best_score = -np.inf
+        best_action = None
+        for i, a in enumerate(moves):
+            undo = game.make_move(state, a)
+            if i == 0:
+                v = -pvs(state, -beta, -alpha, 1)
+            else:
+                v = -pvs(state, -alpha - 1, -alpha, 1)
+                if alpha < v < beta:
+                    v = -pvs(state, -beta, -alpha, 1)
+            game.unmake_move(state, undo)
+            if v > best_score:
+                best_score, best_action = v, a
+            if v > alpha:
+                alpha = v
+            if alpha >= beta:
+                break
+        return best_action, best_score
+
+    # Body of pvs_search starts here:
+
+    if d == -1:
+        d = 4
+
+    if tt is None:
+        tt = TranspositionTable()
+
+    tm = TimeManager(time_budget, node_limit)
+    orderer = MoveOrderer()
+
+    root_key, root_s = canonical_key(state)
+    entry = tt.probe(root_key)
+    root_tt_move = transform_move(entry[4], INVERSES[root_s]) if entry is not None and entry[4] else None
+    moves = orderer.order(state, game.actions(state), 0, root_tt_move)
+    if not moves:
+        return None
+    best_action = moves[0]
+    score = None
+    for depth_limit in range(1, d + 1):
+        iteration_start = time.time()
+        if score is None or abs(score) == np.inf:
+            alpha, beta = -np.inf, np.inf
+        else:
+            alpha, beta = score - window, score + window
+        try:
+            while True:
+                action, v = root_search(moves, alpha, beta)
+                if v <= alpha:
+                    alpha = -np.inf
+                elif v >= beta:
+                    beta = np.inf
+                else:
+                    break
+        except SearchTimeout:
+            break
+        best_action, score = action, v
+        tt.store(root_key, depth_limit, score, EXACT, transform_move(best_action, root_s))
+        if on_iteration is not None:
+            on_iteration(depth_limit, best_action, score)
+        # the next iteration searches the best move first, and takes longer than this one did
+        moves.remove(best_action)
+        moves.insert(0, best_action)
+        if tm.remaining() < time.time() - iteration_start:
+            break
+
+    return to_caller(best_action)
 
 
 # ______________________________________________________________________________
@@ -347,6 +989,27 @@ def expect_minmax_player(game, state):
     return expect_minmax(state, game)
 
 
+def engine_move(player_type, game, state, d=-1, time_budget=5, node_limit=None, workers=None, parallel='root'):
+    """The move chosen for state by the AI player of type player_type, one of PlayerType[1:]. d is the
+    cutoff depth of the cutoff searches, -1 for their default; time_budget and node_limit limit
+    alpha_beta_cutoff_search and pvs_search, the other searches have a fixed 5 second budget. With workers,
+    alpha_beta_cutoff_search runs on that many processes, in the parallel mode given."""
+    if player_type == PlayerType[1]:
+        return random_player(game, state)
+    elif player_type == PlayerType[2]:
+        return minmax_decision(state, game)
+    elif player_type == PlayerType[3]:
+        return alpha_beta_search(state, game)
+    elif player_type == PlayerType[4]:
+        return alpha_beta_cutoff_search(state, game, d=d, time_budget=time_budget, node_limit=node_limit,
+                                        workers=workers, parallel=parallel)
+    elif player_type == PlayerType[5]:
+        return expect_minmax(state, game, d=d)
+    elif player_type == PlayerType[6]:
+        return pvs_search(state, game, d=d, time_budget=time_budget, node_limit=node_limit)
+    raise ValueError("engine_move: no AI player of type " + str(player_type))
+
+
 # ______________________________________________________________________________
 # Some Sample Games
 
@@ -364,10 +1027,19 @@ class Game:
         """Return a list of the allowable moves at this point."""
         raise NotImplementedError
 
-    def result(self, state, move, end):
+    def result(self, state, move, end=None):
         """Return the state that results from making a move from a state."""
         raise NotImplementedError
 
+    def make_move(self, state, move):
+        """Apply move to state in place and return a record that unmake_move can use to undo it.
+        Used by the search functions instead of copying states."""
+        raise NotImplementedError
+
+    def unmake_move(self, state, record):
+        """Undo the move described by record, returned by the last make_move on state."""
+        raise NotImplementedError
+
     def utility(self, state, player):
         """Return the value of this final state to player."""
         raise NotImplementedError
@@ -376,6 +1048,11 @@ class Game:
         """Return True if this is a final state for the game."""
         return not self.actions(state)
 
+    def search_cutoff(self, state):
+        """Return True if the searches are not to look past this state: a final state, unless the game
+        also bounds how deep they go."""
+        return self.terminal_test(state)
+
     def to_move(self, state):
         """Return the player whose move it is in this state."""
         return state.to_move
@@ -430,8 +1107,9 @@ class NMensMorris(Game):
             •	Moving pieces to any vacant point (when the player has been reduced to 3 men)
 
             This class governs all the logic of the game. This means it has to check validity of each player's
-            move, as well as deciding on next move for the AI player. This class receives the game state,
-            in form of the list of rows of cells on the board.
+            move, as well as deciding on next move for the AI player. This class receives the game state
+            as a GameState or a BitboardState, and never looks at the GUI, so that it runs without a display
+            and in worker processes.
 
         '''
 
@@ -442,98 +1120,171 @@ class NMensMorris(Game):
         self.player1 = NMMPlayer(0, PlayerType[1], "X")
         self.player2 = NMMPlayer(1, PlayerType[1], "O")
 
-        self.cells = []
-        self.neighborDict = {}
-        self.setupNeighborhood()
+        self.neighborDict = NEIGHBORS
+        self.tablebase = None  # a tablebase.Tablebase probed by alpha_beta_cutoff_search, if one is loaded
+        self.book = None  # a book.OpeningBook the searches play from, if one is loaded
+        self.weights = load_weights()  # the weights of evaluation.FEATURES bitboard_utility uses
         board = []  # an array of 7 rows, each row an array of element from set {'X', 'O', '-'}.
                     #. 'X' means occupied by Human player, 'O' is occupied by AI, '-' means still vacant
-        self.initial = GameState(to_move='X', utility=0, board={}, moves={}, player1=None, player2=None, depth=0)
-
-    def setupNeighborhood(self):
-        """fills up the dictionary of neighborhood, to be used to find out what cells are neighbors (means player can move to them) to a cell"""
-        # row 0
-        self.neighborDict[(0, 0)] = [(0, 3), (1, 1), (3, 0)]
-        self.neighborDict[(0, 3)] = [(0, 0), (0, 6), (1, 3)]
-        self.neighborDict[(0, 6)] = [(0, 3), (1, 5), (3, 6)]
-
-        # row 1
-        self.neighborDict[(1, 1)] = [(0, 0), (1, 3), (3, 1), (2, 2)]
-        self.neighborDict[(1, 3)] = [(0, 3), (1, 1), (1, 5), (2, 3)]
-        self.neighborDict[(1, 5)] = [(0, 6), (1, 3), (2, 4), (3, 5)]
-
-        # row 2
-        self.neighborDict[(2, 2)] = [(2, 3), (3, 2), (1, 1)]
-        self.neighborDict[(2, 3)] = [(2, 2), (1, 3), (2, 4)]
-        self.neighborDict[(2, 4)] = [(2, 3), (3, 4), (1, 5)]
-
-        # row 3
-        self.neighborDict[(3, 0)] = [(0, 0), (6, 0), (3, 1)]
-        self.neighborDict[(3, 1)] = [(3, 0), (3, 2), (1, 1), (5, 1)]
-        self.neighborDict[(3, 2)] = [(3, 1), (2, 2), (4, 2)]
-        self.neighborDict[(3, 4)] = [(3, 5), (2, 4), (4, 4)]
-        self.neighborDict[(3, 5)] = [(3, 4), (3, 6), (1, 5), (5, 5)]
-        self.neighborDict[(3, 6)] = [(3, 5), (0, 6), (6, 6)]
-
-        # row 4
-        self.neighborDict[(4, 2)] = [(4, 3), (3, 2), (5, 1)]
-        self.neighborDict[(4, 3)] = [(4, 2), (4, 4), (5, 3)]
-        self.neighborDict[(4, 4)] = [(4, 3), (3, 4), (5, 5)]
-
-        # row 5
-        self.neighborDict[(5, 1)] = [(6, 0), (5, 3), (3, 1), (4, 2)]
-        self.neighborDict[(5, 3)] = [(6, 3), (5, 1), (5, 5), (4, 3)]
-        self.neighborDict[(5, 5)] = [(6, 6), (5, 3), (4, 4), (3, 5)]
-
-        # row 6
-        self.neighborDict[(6, 0)] = [(6, 3), (5, 1), (3, 0)]
-        self.neighborDict[(6, 3)] = [(6, 0), (6, 6), (5, 3)]
-        self.neighborDict[(6, 6)] = [(6, 3), (5, 5), (3, 6)]
-
-
-
-    def getButton(self, pos):
-        lpos = list(pos)
-        for cellrow in self.cells:
-            for cell in cellrow:
-                if cell.pos == lpos:
-                    return cell.button
-
-        print("getButton(): button at pos ", pos, " is not found")
-        raise "getButton: wrong position passed!"
-        return None
+        self.initial = BitboardState()
+
+    def occupied(self, state):
+        """Bitboard of the points taken in a GameState, from the pieces of its players."""
+        return to_mask(state.player1.poses) | to_mask(state.player2.poses)
 
     def findPossibleMoves(self, player, state):
         """For player find all the pieces which can potentially move"""
-        moves = []   # a dictionary of start:[possible ends] which represent a start position as key, all possible end positions as value
-        if player.sym == "X":
-            opponent = state.player2
-        else:
-            opponent = state.player1
-
-        for pos in player.poses:
-            possibleEnds = self.findPossibleEnds(player, pos)
-            if len(possibleEnds) > 0:
-                for x in range(len(possibleEnds)):
-                    if (possibleEnds[x] not in opponent.poses) and (possibleEnds[x] not in player.poses):
-                        moves.append((pos, possibleEnds[x]))
+        moves = []   # a list of (start, end) position pairs, from the move generator of movegen.py
+        empty = FULL_MASK & ~self.occupied(state)
+        flying = player.step == GameSteps[1] and player.livePieces == 3
+        for start, end in iter_steps(to_mask(player.poses), empty, flying=flying):
+            moves.append((POINTS[start], POINTS[end]))
 
         return moves
 
 
-    def findPossibleEnds(self, player, pos):
-        """Find all possible end position as legal move from pos position for player"""
-        validEnds = []
-        possibleEnds = self.neighborDict[pos]
-        for end in possibleEnds:
-            button = self.getButton(end)
-            if button["text"] == "":
-                validEnds.append(end)
+    def to_bitboard(self, state):
+        """Convert a GameState built from NMMPlayer objects into the equivalent BitboardState."""
+        x_bits = to_mask(state.player1.poses)
+        o_bits = to_mask(state.player2.poses)
+        x_hand = state.player1.livePieces - len(state.player1.poses) if state.player1.step == GameSteps[0] else 0
+        o_hand = state.player2.livePieces - len(state.player2.poses) if state.player2.step == GameSteps[0] else 0
+        return BitboardState(state.to_move, x_bits, o_bits, x_hand, o_hand, state.depth)
+
+    def to_coords(self, move):
+        """Translate a bitboard move into the form used by the GUI: (piece move, capture), where the piece
+        move is (row, col) for a placement and ((row, col), (row, col)) for moving a piece, and capture is
+        the (row, col) of the opponent piece the move removes, or None."""
+        start, end, captured = move
+        capture = POINTS[captured] if captured >= 0 else None
+        if start < 0:
+            return POINTS[end], capture
+        return (POINTS[start], POINTS[end]), capture
+
+    def bitboard_actions(self, state):
+        """Moves on a BitboardState as (start, end, captured) point indices; start is -1 for a placement
+        and captured is -1 unless the move closes a mill. A move closing a mill comes once for every
+        opponent piece it may capture. A side down to 3 pieces flies. See movegen.py."""
+        own, opp = state.pieces(state.to_move)
+        hand = state.hand(state.to_move)
+        return generate_moves(own, opp, hand, flies(own, hand))
+
+    def destinations(self, start, own, empty):
+        """Bitboard of the points the piece on start can move to, own being the pieces of its side and empty
+        the vacant points: all of them when the side is down to 3 pieces and flies. Moving is symmetric, so
+        these are also the points it can have come from."""
+        if flies(own, 0):
+            return empty
+        return DESTINATIONS[start] & empty
+
+    def batch_children(self, state, moves):
+        """The positions after each of moves in state, as the arrays (x_bits, o_bits, x_hand, o_hand,
+        x_to_move) evaluation.batch_utility takes. moves are all placements or all piece moves."""
+        own, opp = state.pieces(state.to_move)
+        own_bits = []
+        opp_bits = []
+        for start, end, captured in moves:
+            own_bits.append(own & ~(1 << start) | 1 << end if start >= 0 else own | 1 << end)
+            opp_bits.append(opp & ~(1 << captured) if captured >= 0 else opp)
+        n = len(moves)
+        own_hand = np.full(n, state.hand(state.to_move) - (1 if moves and moves[0][0] < 0 else 0))
+        if state.to_move == 'X':
+            return own_bits, opp_bits, own_hand, np.full(n, state.o_hand), np.zeros(n, dtype=bool)
+        return opp_bits, own_bits, np.full(n, state.x_hand), own_hand, np.ones(n, dtype=bool)
 
-        return validEnds
+    def bitboard_result(self, state, move):
+        """Return the BitboardState after move, leaving state untouched."""
+        state = state.copy()
+        self.make_move(state, move)
+        return state
 
+    def make_move(self, state, move):
+        """Apply move to a BitboardState in place and return the MoveRecord unmake_move needs to take it
+        back. A move closing a mill removes the opponent piece it names."""
+        start, end, captured = move
+        sym = state.to_move
+        side = 0 if sym == 'X' else 1
+        own, opp = state.pieces(sym)
+        old_features = state.features
+        state.features = update_features(old_features, move, side, state.x_bits, state.o_bits)
+
+        own |= 1 << end
+        if start < 0:
+            if sym == 'X':
+                state.x_hand -= 1
+            else:
+                state.o_hand -= 1
+        else:
+            own &= ~(1 << start)
+
+        if captured >= 0:
+            opp &= ~(1 << captured)
+
+        if sym == 'X':
+            state.x_bits, state.o_bits, state.to_move = own, opp, 'O'
+        else:
+            state.x_bits, state.o_bits, state.to_move = opp, own, 'X'
+        state.depth += 1
+
+        return MoveRecord(move, captured, old_features)
+
+    def unmake_move(self, state, record):
+        """Take back the move described by record, which must be the last move made on state. Undoing a
+        placement puts the piece back in hand, which also restores the 'Setup' step if the placement
+        had ended it."""
+        start, end, _ = record.move
+        sym = 'O' if state.to_move == 'X' else 'X'
+        own, opp = state.pieces(sym)
+
+        own &= ~(1 << end)
+        if start < 0:
+            if sym == 'X':
+                state.x_hand += 1
+            else:
+                state.o_hand += 1
+        else:
+            own |= 1 << start
+
+        if record.captured >= 0:
+            opp |= 1 << record.captured
+
+        if sym == 'X':
+            state.x_bits, state.o_bits = own, opp
+        else:
+            state.x_bits, state.o_bits = opp, own
+        state.to_move = sym
+        state.depth -= 1
+        state.features = record.features
+
+    def bitboard_loser(self, state):
+        """Return the side that has lost in state, or None if the game is still on. A side loses when it is
+        down to 2 pieces, or when it is to move, has nothing left to place and cannot move any piece. A side
+        that flies can always move."""
+        if state.live_pieces('X') < 3:
+            return 'X'
+        if state.live_pieces('O') < 3:
+            return 'O'
+        side = 0 if state.to_move == 'X' else 1
+        if state.hand(state.to_move) == 0 and not state.features[MOVES + side] and \
+                state.live_pieces(state.to_move) > 3:
+            return state.to_move
+        return None
+
+    def bitboard_utility(self, state):
+        """Static value of state for X: +-100 for a decided game, otherwise the weighted sum of its
+        evaluation features with self.weights, by default 3 per piece of material advantage plus the
+        difference in the number of possible moves. The features are read from state.features, so this
+        takes constant time."""
+        loser = self.bitboard_loser(state)
+        if loser is not None:
+            return -100 if loser == 'X' else 100
+        return linear_value(state_features(state), self.weights)
 
     def actions(self, state):
         """Legal moves are any square not yet taken."""
+        if isinstance(state, BitboardState):
+            return self.bitboard_actions(state)
+
         player = state.to_move
         moves = state.moves
         game_step = GameSteps[0]
@@ -557,7 +1308,7 @@ class NMensMorris(Game):
 
 
     def isMoveLegal(self, start, end, sym, state):
-        """ check to see if cells with pos start and end are neighbors or not"""
+        """ check to see if cells with pos start and end are neighbors or not, or if the player flies"""
 
         theNeigbors = self.neighborDict[start]
 
@@ -571,7 +1322,8 @@ class NMensMorris(Game):
             opponent = state.player1
 
 
-        if (end in theNeigbors) and (start in player.poses) and (end not in opponent.poses) and (end not in player.poses):
+        flying = player.step == GameSteps[1] and player.livePieces == 3
+        if (end in theNeigbors or flying) and (start in player.poses) and (end not in opponent.poses) and (end not in player.poses):
             return True
 
         return False
@@ -583,7 +1335,7 @@ class NMensMorris(Game):
         a piece from the opponent."""
 
         theNeigbors = self.neighborDict[pos]
-        mills = []
+        mills = closed_mills(POINT_INDEX[pos], to_mask(player.poses))
         board = state.board.copy()
         mil_flag = 0
         next_to_piece_flag = 0
@@ -597,8 +1349,6 @@ class NMensMorris(Game):
             playerr = state.player1
 
         for next in theNeigbors:
-            #check if next, pos, are part of a mill:
-
             if next in opponent.poses:
                 opponent_next = 1
 
@@ -608,25 +1358,14 @@ class NMensMorris(Game):
                 x2,y2 = next
                 dx, dy = x1-x2, y1-y2
                 x3,y3 = x2-dx, y2-dy
-                x4, y4 = x1+dx, y1+dy
                 if ((x3, y3) not in state.player1.poses) or ((x3, y3) not in state.player2.poses):
                     free_space_2mil_flag = 1
 
-                if (x3,y3) in player.poses:
-                    newmill = {pos, next, (x3, y3)}
-                    if newmill not in mills:
-                        mills.append(newmill)
-                elif (x4, y4) in player.poses:
-                    newmill = {pos, next, (x4, y4)}
-                    if newmill not in mills:
-                        mills.append(newmill)
 
-
-        for i in range(len(mills)):
-
-            # change random to something else
+        if mills and opponent.poses:
+            # one capture per move, the first piece the mill rule allows, as NMensMorris.bitboard_actions does
             mil_flag = 1
-            pos2cull = random.choice(opponent.poses)
+            pos2cull = to_poses(removable(to_mask(opponent.poses)))[0]
 
             board[pos2cull] = ""
             opponent.poses.remove(pos2cull)
@@ -637,30 +1376,15 @@ class NMensMorris(Game):
 
 
     def free_cells(self, state):
-        freecells = []
-
-        spots = [(0, 0), (0, 3), (0, 6), (1, 1), (1, 3), (1, 5), (2, 2), (2, 3), (2, 4),
-                 (3, 0), (3, 1), (3, 2), (3, 4), (3, 5), (3, 6), (4, 2), (4, 3), (4, 4), (5, 1), (5, 3),
-                 (5, 5), (6, 0), (6, 3), (6, 6)]
-
-        boardt = {}
-
-        for pos in spots:
-            boardt[pos] = ""
-        for pos in state.player1.poses:
-            boardt[pos] = 'X'
-        for pos in state.player2.poses:
-            boardt[pos] = 'O'
+        """The points no piece of state stands on."""
+        return to_poses(FULL_MASK & ~self.occupied(state))
 
-        for pos in spots:
-            if (boardt[pos] != "X" or boardt[pos] != "0"):
-                freecells.append(pos)
 
-        return freecells
 
+    def result(self, state, move, end=None):
 
-
-    def result(self, state, move, end):
+        if isinstance(state, BitboardState):
+            return self.bitboard_result(state, move)
 
         if state.to_move == 'X' and state.player1.step == GameSteps[1] \
                 and (state.player1.type == PlayerType[3] or state.player2.type == PlayerType[3]
@@ -712,7 +1436,7 @@ class NMensMorris(Game):
                     return state
 
 
-        if time.time() > end:
+        if end is not None and time.time() > end:
             return state
 
         start, end = move
@@ -845,6 +1569,9 @@ class NMensMorris(Game):
 
     def utility(self, state, player):
         """Return the value to player; 1 for win, -1 for loss, 0 otherwise."""
+        if isinstance(state, BitboardState):
+            value = self.bitboard_utility(state)
+            return value if player == 'X' else -value
         return state.utility if player == 'X' else -state.utility
 
 
@@ -869,6 +1596,9 @@ class NMensMorris(Game):
         """A state is terminal if it is won or there are no empty squares."""
 
         #or state.depth >= 10
+        if isinstance(state, BitboardState):
+            return self.bitboard_loser(state) is not None
+
         if state.to_move == 'X':
             return state.player2.livePieces <= 2 or len(state.moves) == 0 or state.depth >= 20 or state.utility >= 3 or state.utility <= -2
         elif state.to_move == 'O':
@@ -876,7 +1606,22 @@ class NMensMorris(Game):
 
         return False
 
+    def search_cutoff(self, state):
+        """A search stops at a terminal state, and SEARCH_HORIZON plies below its root: the depth of a
+        searched BitboardState counts the plies from the root."""
+        if isinstance(state, BitboardState):
+            return state.depth >= SEARCH_HORIZON or self.terminal_test(state)
+        return self.terminal_test(state)
+
     def display(self, state):
+        if isinstance(state, BitboardState):
+            board = {pos: 'X' for pos in to_poses(state.x_bits)}
+            board.update((pos, 'O') for pos in to_poses(state.o_bits))
+            for row in range(7):
+                print(' '.join(board.get((row, col), '.') if (row, col) in POINT_INDEX else ' '
+                               for col in range(7)).rstrip())
+            print("to move: {}, in hand: X {}, O {}".format(state.to_move, state.x_hand, state.o_hand))
+            return
         board = state.board.copy()
         for x in range(1, self.h + 1):
             for y in range(1, self.v + 1):
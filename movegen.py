@@ -0,0 +1,118 @@
+"""
+Legal move generation on bitboards (see topology.py).
+
+A move is a (start, end, captured) triple of point indices: start is -1 for a placement, and captured is
+the opponent piece a move closing a mill removes, -1 for a move closing none. A move closing a mill comes
+once for every opponent piece it may capture.
+
+The points a piece may go to are one mask operation: the empty points for a placement or a flying piece,
+the empty points among DESTINATIONS[start] for a piece sliding from start. Whether a move closes a mill is
+a test against the two MILL_PAIRS of its end point, and the capturable pieces are only worked out once a
+move closes a mill.
+
+A side down to 3 pieces on the board, with none left to place, flies: any of its pieces may go to any
+empty point. flying_moves generates these up to 3 x 21 moves without testing every one of them for a
+mill: a piece can only close the mill of the other two, on the one point that completes it.
+"""
+
+from itertools import permutations
+
+from topology import POINTS, FULL_MASK, NEIGHBOR_MASKS, MILLS, POINT_MILLS, popcount, bit_indices, removable
+
+# DESTINATIONS[i] is the bitboard of the points a piece on POINTS[i] slides to when they are empty
+DESTINATIONS = NEIGHBOR_MASKS
+# MILL_PAIRS[i] are the bitboards of the two other points of the row and column mills of POINTS[i]: a piece
+# arriving on POINTS[i] closes a mill when its side holds both points of either
+MILL_PAIRS = [tuple(m & ~(1 << i) for m in POINT_MILLS[i]) for i in range(len(POINTS))]
+# MILL_THIRD[i][j] is the point completing the mill through POINTS[i] and POINTS[j], -1 if they share none
+MILL_THIRD = [[-1] * len(POINTS) for _ in POINTS]
+for _mill in MILLS:
+    for _i, _j, _k in permutations(_mill):
+        MILL_THIRD[_i][_j] = _k
+# A bound on the number of legal moves of any position, the size of a buffer for generate_moves
+MAX_MOVES = len(POINTS) * len(POINTS)
+
+
+def iter_steps(own, empty, hand=0, flying=False):
+    """The (start, end) piece moves of a side with pieces own and hand pieces in hand, empty being the
+    vacant points: placements on the empty points while it has pieces in hand, otherwise moves of each
+    piece to the empty points, its empty neighbors unless it is flying."""
+    if hand > 0:
+        for end in bit_indices(empty):
+            yield -1, end
+        return
+    for start in bit_indices(own):
+        for end in bit_indices(empty if flying else DESTINATIONS[start] & empty):
+            yield start, end
+
+
+def flies(own, hand):
+    """True if the side with pieces own and hand pieces in hand flies."""
+    return hand <= 0 and popcount(own) == 3
+
+
+def generate_moves(own, opp, hand=0, flying=False, out=None):
+    """The legal (start, end, captured) moves of the side with pieces own and hand pieces in hand, against
+    the pieces opp, as in iter_steps. They are returned as a new list or, given a preallocated list out of
+    at least MAX_MOVES entries, written to the start of out, and then their number is returned. Reusing one
+    buffer per ply spares a search allocating a new list at every node."""
+    if flying and hand <= 0 and popcount(own) == 3:
+        return flying_moves(own, opp, out)
+    empty = FULL_MASK & ~(own | opp)
+    moves = [] if out is None else out
+    n = 0
+    captures = None
+    if hand > 0:
+        starts = (-1,)
+    else:
+        starts = bit_indices(own)
+    for start in starts:
+        if start < 0:
+            ends, moved = empty, own
+        else:
+            ends = empty if flying else DESTINATIONS[start] & empty
+            moved = own & ~(1 << start)
+        for end in bit_indices(ends):
+            row, col = MILL_PAIRS[end]
+            if moved & row == row or moved & col == col:
+                if captures is None:
+                    captures = bit_indices(removable(opp)) or [-1]
+                for captured in captures:
+                    if out is None:
+                        moves.append((start, end, captured))
+                    else:
+                        out[n] = (start, end, captured)
+                    n += 1
+            elif out is None:
+                moves.append((start, end, -1))
+            else:
+                out[n] = (start, end, -1)
+                n += 1
+    return moves if out is None else n
+
+
+def flying_moves(own, opp, out=None):
+    """The legal moves of a flying side with exactly 3 pieces own against the pieces opp, as generate_moves
+    returns them. Each piece closes a mill only on the point MILL_THIRD of the other two, so its moves are
+    its flights to the other empty points, then the flights to that point if it is empty, with every capture."""
+    empty = FULL_MASK & ~(own | opp)
+    ends = bit_indices(empty)
+    a, b, c = bit_indices(own)
+    moves = [] if out is None else out
+    n = 0
+    captures = None
+    for start, p, q in ((a, b, c), (b, a, c), (c, a, b)):
+        third = MILL_THIRD[p][q]
+        if third >= 0 and empty >> third & 1:
+            if captures is None:
+                captures = bit_indices(removable(opp)) or [-1]
+            flights = [(start, end, -1) for end in ends if end != third]
+            flights.extend([(start, third, captured) for captured in captures])
+        else:
+            flights = [(start, end, -1) for end in ends]
+        if out is None:
+            moves.extend(flights)
+        else:
+            out[n:n + len(flights)] = flights
+            n += len(flights)
+    return moves if out is None else n
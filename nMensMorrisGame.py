@@ -1,12 +1,15 @@
 import random
-import time
 from tkinter import *
 import tkinter.font as font
 from games import NMensMorris
-import games
+from tablebase import Tablebase
+from book import OpeningBook
+from evaluation import load_weights
+from engine_driver import EngineDriver
+from topology import NEIGHBORS, NEIGHBOR_MASKS, POINT_INDEX, to_mask, to_poses, closed_mills, removable
 from collections import namedtuple
 import sys
-import copy
+import os
 sys.setrecursionlimit(2000)
 
 """
@@ -16,8 +19,9 @@ MinMax: # For AI player. Uses MinMax adversarial algorithm all the way to the le
 AlphaBeta(MinMax with Alpha-Beta Pruning): # For AI player. Uses AlphaBeta algorithm all the way to the leaf
 AlphaBetaCutoff (AlphaBeta with cutoff depth): # For AI player. Similar to AlphaBeta case, except now the computation is cutoff at a depth d and an evaluation function is used at that level for Utility value
 ExpectimaxCutoff: Use chance nodes instead of the min nodes. This means at min level, use average of all successors' utility value. Similar to abov case, computation is cutoff at depth d
+PVS: # For AI player. Principal variation search (NegaScout) with aspiration windows. Plays like AlphaBetaCutoff but searches fewer nodes for the same depth d
 """
-PlayerType = ["Human", "Random", "MinMax", "AlphaBeta", "AlphaBetaCutoff", "ExpectimaxCutoff"]
+PlayerType = ["Human", "Random", "MinMax", "AlphaBeta", "AlphaBetaCutoff", "ExpectimaxCutoff", "PVS"]
 GameState = namedtuple('GameState', 'to_move, utility, board, moves, player1, player2, depth')
 
 class Cell:
@@ -59,8 +63,15 @@ class BoardGui(Frame):
     cells = []  # all the cells of the board
     to_move = "X"  # It can have 2 values: X for human player  or O for AI player
     dims = 7  # game board dimension : 7 x 7
-    neighborDict = {}   # a dictionary of assigning neighbor cells to each cell.
+    neighborDict = NEIGHBORS   # a dictionary of assigning neighbor cells to each cell.
     stop_flag = 0
+    pace = 500  # milliseconds to wait before player2 answers a move, so moves can be followed. 0 plays at full speed
+    pending = None  # Tk id of the scheduled answer of player2, while there is one
+    workers = None  # processes AlphaBetaCutoff searches on, None searches in the engine process alone
+    parallel = 'root'  # how the processes share the search: 'root' splits the root moves, 'smp' is lazy SMP
+    poll_interval = 50  # milliseconds between two looks at the engine process while it searches
+    polling = None  # Tk id of the scheduled look at the engine process, while a search runs
+    after_search = None  # what to do once the running search has played its move
 
     def __init__(self, parent, board):
 
@@ -69,10 +80,13 @@ class BoardGui(Frame):
         self.player2 = NMMPlayer(1, PlayerType[1], "O")
         game.player1 = self.player1
         game.player2 = self.player2
-        game.cells = self.cells
 
         self.game = board
         self.parent = parent
+        self.driver = EngineDriver()
+        self.cellAt = {}  # (row, col) of every point of the board: its Cell
+        self.posOf = {}  # button of every point of the board: its (row, col)
+        self.board = {}  # (row, col) of every point of the board: 'X', 'O' or "" if it is empty. The buttons show it
 
         # setup the game board:
         for i in range(self.dims):
@@ -91,6 +105,9 @@ class BoardGui(Frame):
                         button.config(command=lambda btn=button: self.on_click(btn))
                         button.pack(padx=5, pady=5)
                         cellsInFrame.append(Cell([i, j], button))
+                        self.cellAt[(i, j)] = cellsInFrame[-1]
+                        self.posOf[button] = (i, j)
+                        self.board[(i, j)] = ""
                 elif(i==3 and j==3):
                     frame.config(height= 30, width=30, bg='black')
                 else:
@@ -143,17 +160,24 @@ class BoardGui(Frame):
         self.gameResultLabel = Label(master=parent, text="Player1 Turn:", fg="white", bg="black", width=13)
         self.gameResultLabel.grid(row=self.dims+1, column=5, padx=2, pady=2)
 
-        self.setupNeighborhood()
-
 
 
     def reset(self):
         """reset the game's board"""
         print("Resetting the game.")
 
-        for row in self.cells:
-            for x in row:
-                x.button.config(state='normal', text="")
+        if self.pending is not None:
+            self.parent.after_cancel(self.pending)
+            self.pending = None
+        if self.polling is not None:
+            self.parent.after_cancel(self.polling)
+            self.polling = None
+        self.driver.cancel()
+        self.after_search = None
+
+        for pos, cell in self.cellAt.items():
+            self.board[pos] = ""
+            cell.button.config(state='normal', text="")
 
         self.stop_flag = 0
         self.player1.reset()
@@ -162,47 +186,6 @@ class BoardGui(Frame):
         self.player2Label["text"] = "LivePieces_2:"+str(self.player2.livePieces)
         self.gameResultLabel["text"] = "Player1 Turn:"
 
-    def setupNeighborhood(self):
-        """fills up the dictionary of neighborhood, to be used to find out what cells are neighbors (means player can move to them) to a cell"""
-        #row 0
-        self.neighborDict[(0, 0)] = [(0, 3), (1, 1), (3, 0)]
-        self.neighborDict[(0, 3)] = [(0, 0), (0, 6), (1, 3)]
-        self.neighborDict[(0, 6)] = [(0, 3), (1, 5), (3, 6)]
-
-        #row 1
-        self.neighborDict[(1, 1)] = [(0, 0), (1, 3), (3, 1), (2, 2)]
-        self.neighborDict[(1, 3)] = [(0, 3), (1, 1), (1, 5), (2, 3)]
-        self.neighborDict[(1, 5)] = [(0, 6), (1, 3), (2, 4), (3, 5)]
-
-        #row 2
-        self.neighborDict[(2, 2)] = [(2, 3), (3, 2), (1, 1)]
-        self.neighborDict[(2, 3)] = [(2, 2), (1, 3), (2, 4)]
-        self.neighborDict[(2, 4)] = [(2, 3), (3, 4), (1, 5)]
-
-        #row 3
-        self.neighborDict[(3, 0)] = [(0, 0), (6, 0), (3, 1)]
-        self.neighborDict[(3, 1)] = [(3, 0), (3, 2), (1, 1), (5, 1)]
-        self.neighborDict[(3, 2)] = [(3, 1), (2, 2), (4, 2)]
-        self.neighborDict[(3, 4)] = [(3, 5), (2, 4), (4, 4)]
-        self.neighborDict[(3, 5)] = [(3, 4), (3, 6), (1, 5), (5, 5)]
-        self.neighborDict[(3, 6)] = [(3, 5), (0, 6), (6, 6)]
-
-        #row 4
-        self.neighborDict[(4, 2)] = [(4, 3), (3, 2), (5, 1)]
-        self.neighborDict[(4, 3)] = [(4, 2), (4, 4), (5, 3)]
-        self.neighborDict[(4, 4)] = [(4, 3), (3, 4), (5, 5)]
-
-        #row 5
-        self.neighborDict[(5, 1)] = [(6, 0), (5, 3), (3, 1), (4, 2)]
-        self.neighborDict[(5, 3)] = [(6, 3), (5, 1), (5, 5), (4, 3)]
-        self.neighborDict[(5, 5)] = [(6, 6), (5, 3), (4, 4), (3, 5)]
-
-        #row 6
-        self.neighborDict[(6, 0)] = [(6, 3), (5, 1), (3, 0)]
-        self.neighborDict[(6, 3)] = [(6, 0), (6, 6), (5, 3)]
-        self.neighborDict[(6, 6)] = [(6, 3), (5, 5), (3, 6)]
-
-
     def set_player1(self, choice):
         """ Set the level of first player. If chosen Human, it is human player.
         """
@@ -224,143 +207,119 @@ class BoardGui(Frame):
         print("set_depth: depth set to ", int(x))
 
     def getCoordinates(self, btn):
-        try:
-            for i in range(self.dims):
-                row = self.cells[i]
-                for j in range(len(row)):
-                    if row[j].button == btn:
-                        return row[j].pos
-        except IndexError:
+        pos = self.posOf.get(btn)
+        if pos is None:
             print("ERROR! getCoordinate(): could not find the button's indices\n")
-            return
+        return pos
 
     def printBoard(self):
-        try:
-            for i in range(self.dims):
-                for j in range(self.cells[i]):
-                    cell = self.cells[i][j]
-                    print("Cell: ",i, ", ",j, ", text:", cell.button["text"])
-                print("\n")
-        except IndexError:
-            print("printboard: index error ")
+        for pos, sym in sorted(self.board.items()):
+            print("Cell: ", pos[0], ", ", pos[1], ", text:", sym)
+
+    def setCell(self, pos, sym):
+        """put sym, 'X', 'O' or "" for an empty point, on pos in the board model and show it on its button"""
+        self.board[pos] = sym
+        self.cellAt[pos].button["text"] = sym
 
 
     def quit(self):
         print("Quitting the game.")
+        self.driver.cancel()
         self.parent.destroy()
 
     def getButton(self, pos):
-        lpos = list(pos)
-        for cellrow in self.cells:
-            for cell in cellrow:
-                if cell.pos == lpos:
-                    return cell.button
-
-        print("getButton(): button at pos ", pos, " is not found")
-        raise "getButton: wrong position passed!"
-        return None
+        cell = self.cellAt.get(tuple(pos))
+        if cell is None:
+            print("getButton(): button at pos ", pos, " is not found")
+            raise ValueError("getButton: wrong position passed!")
+        return cell.button
 
     def disable_game(self):
         """
         This function deactivates the game after a win, loss or draw or error.
         """
         self.stop_flag = 1
-        for row in self.cells:
-            for x in row:
-                x.button.config(state='disable')
+        for cell in self.cellAt.values():
+            cell.button.config(state='disable')
 
 
     def on_click_AI(self):
 
+        if self.pending is not None or self.driver.busy():
+            return  # still waiting for player2 to answer the previous move
+
         if self.player1.type == PlayerType[0]:
             print("Human player detected, button disabled.")
         elif self.player1.type == PlayerType[1]:
             print("Random AI finding move for X.")
             self.randomPlayerMove("X")
-        elif self.player1.type == PlayerType[2]:
-            self.ai_move("X", "MinMax")
-        elif self.player1.type == PlayerType[3]:
-            self.ai_move("X", "AlphaBeta")
-        elif self.player1.type == PlayerType[4]:
-            self.ai_move("X", "AlphaBetaCutoff")
-        elif self.player1.type == PlayerType[5]:
-            self.ai_move("X", "ExpectimaxCutoff")
+            self.schedule_player2()
+        else:
+            # the search runs in the background, player2 answers once it has played
+            self.ai_move("X", self.player1.type, then=self.schedule_player2)
 
+    def schedule_player2(self):
+        """schedule the answer of player2, after the pause that lets the moves be followed"""
+        self.pending = self.parent.after(self.pace, self.player2_move)
 
-        if self.player1.type == PlayerType[0]:
-            pass
-        elif self.player2.type == PlayerType[1] and self.stop_flag != 1:
+    def player2_move(self):
+        """play the move of player2, scheduled after each move of player1"""
+        self.pending = None
+
+        if self.stop_flag == 1:
+            return
+        if self.player2.type == PlayerType[1]:
             print("Random AI finding move for O.")
             self.randomPlayerMove("O")
-        elif self.player2.type == PlayerType[2] and self.stop_flag != 1:
-            self.ai_move("O", "MinMax")
-        elif self.player2.type == PlayerType[3] and self.stop_flag != 1:
-            self.ai_move("O", "AlphaBeta")
-        elif self.player2.type == PlayerType[4] and self.stop_flag != 1:
-            self.ai_move("O", "AlphaBetaCutoff")
-        elif self.player2.type == PlayerType[5] and self.stop_flag != 1:
-            self.ai_move("O", "ExpectimaxCutoff")
-
-
+        else:
+            self.ai_move("O", self.player2.type)
+
+    def ai_move(self, player, algo, then=None):
+        """start the search of a move for player with the algo AI player in the engine process. poll_engine
+        plays the move once the search is done, and calls then afterwards"""
+        state = GameState(to_move=player, utility=0, board={}, moves=[], player1=self.player1, player2=self.player2,
+                          depth=0)
+        print(algo, "calculating, please wait...")
+        self.gameResultLabel["text"] = player + " thinking..."
+        self.after_search = then
+        self.driver.start(algo, self.game.to_bitboard(state), self.game, d=self.depth, workers=self.workers,
+                          parallel=self.parallel)
+        self.polling = self.parent.after(self.poll_interval, lambda: self.poll_engine(player))
+
+    def poll_engine(self, player):
+        """show the best move so far of the search of player's move, and play its move when it is done"""
+        self.polling = None
+        for message in self.driver.poll():
+            if message[0] == 'info':
+                _, depth, move, score = message
+                if move is not None:
+                    piece_move, capture = self.game.to_coords(move)
+                    print("depth", depth, "best move", piece_move, "capture", capture, "score", score)
+                    self.gameResultLabel["text"] = "{} d{}: {}".format(player, depth, score)
+            else:
+                self.gameResultLabel["text"] = "Player1 Turn:"
+                self.play_ai_move(player, message[1])
+                then, self.after_search = self.after_search, None
+                if then is not None and self.stop_flag != 1:
+                    then()
+                return
+        self.polling = self.parent.after(self.poll_interval, lambda: self.poll_engine(player))
 
-    def ai_move(self, player, algo):
-        """randomly select a move for player"""
+    def play_ai_move(self, player, move):
+        """apply the bitboard move found by the engine for player"""
 
         if player == "O":
             curPlayer = self.player2
         else:
             curPlayer = self.player1
 
+        if move is None:
+            print("!No more move possible for player ", player)
+            return
+        piece_move, capture = self.game.to_coords(move)
 
         if curPlayer.step == GameSteps[0]:
-
-            freeCells = []
-            x_positions = []
-            o_positions = []
-            for cellrow in self.cells:
-                for cell in cellrow:
-                    if cell.button["text"] == "":
-                        x, y = cell.pos
-                        freeCells.append((x, y))
-                    if cell.button["text"] == "X":
-                        x, y = cell.pos
-                        x_positions.append((x, y))
-                    if cell.button["text"] == "O":
-                        x, y = cell.pos
-                        o_positions.append((x, y))
-            board = {}
-
-            for pos in x_positions:
-                board[pos] = 'X'
-            for pos in o_positions:
-                board[pos] = 'O'
-
-            state = GameState(to_move=player, utility=0, board=board, moves=freeCells, player1=self.player1, player2=self.player2, depth=0)
-
-            savep1 = copy.deepcopy(self.player1)
-            savep2 = copy.deepcopy(self.player2)
-
-
-            if algo == "MinMax" :
-                print("MinMax AI calculating, please wait 5 seconds...")
-                x, y = games.minmax_decision(state, game)
-            elif algo == "AlphaBeta":
-                print("AlphaBeta AI calculating, please wait 5 seconds...")
-                x, y = games.alpha_beta_search(state, game)
-            elif algo == "AlphaBetaCutoff":
-                print("AlphaBetaCutoff calculating, please wait 5 seconds...")
-                x, y = games.alpha_beta_cutoff_search(state, game, d=self.depth)
-            elif algo == "ExpectimaxCutoff":
-                print("ExpectimaxCutoff calculating, please wait 5 seconds...")
-                x, y = games.expect_minmax(state, game, d=self.depth)
-
-            self.player1 = savep1
-            self.player2 = savep2
-
-            if player == "O":
-                curPlayer = self.player2
-            else:
-                curPlayer = self.player1
+            x, y = piece_move
 
             if len(curPlayer.poses) < curPlayer.livePieces:  # means we are in phase 1 of the game still putting down new pieces
 
@@ -370,81 +329,24 @@ class BoardGui(Frame):
                     print("!!ERROR! getButton returned null. Error")
                     return
 
-                button.config(text=player, state='disabled', disabledforeground="green")
+                self.setCell((x, y), player)
+                button.config(state='disabled', disabledforeground="green")
 
-                print("AI Move: button.text=", button['text'], "pos: ", x, ", ", y)
+                print("AI Move: button.text=", self.board[(x, y)], "pos: ", x, ", ", y)
 
-                self.checkMillForPlayer(curPlayer, (x, y))
+                self.checkMillForPlayer(curPlayer, (x, y), capture)
                 if len(curPlayer.poses) == curPlayer.livePieces:
                     curPlayer.step = GameSteps[1]
                     self.enablePlayerCells(curPlayer.poses)
 
         else:  # means we are in phase 2 mode, meaning player need to move a piece.
-
-            freeCells = []
-            x_positions = []
-            o_positions = []
-            for cellrow in self.cells:
-                for cell in cellrow:
-                    if cell.button["text"] == "":
-                        x, y = cell.pos
-                        freeCells.append((x, y))
-                    if cell.button["text"] == "X":
-                        x, y = cell.pos
-                        x_positions.append((x, y))
-                    if cell.button["text"] == "O":
-                        x, y = cell.pos
-                        o_positions.append((x, y))
-            board = {}
-
-            for pos in x_positions:
-                board[pos] = 'X'
-            for pos in o_positions:
-                board[pos] = 'O'
-
-            potentialMoves = self.findPossibleMoves2(curPlayer)
-
-            state = GameState(to_move=player, utility=0, board=board, moves=potentialMoves, player1=self.player1,
-                             player2=self.player2, depth=0)
-
-            savep1 = copy.deepcopy(self.player1)
-            savep2 = copy.deepcopy(self.player2)
-
-            if algo == "MinMax":
-                print("MinMax AI calculating, please wait 5 seconds...")
-                start, end = games.minmax_decision(state, game)
-            elif algo == "AlphaBeta":
-                print("AlphaBeta AI calculating, please wait 5 seconds...")
-                start, end = games.alpha_beta_search(state, game)
-            elif algo == "AlphaBetaCutoff":
-                print("AlphaBetaCutoff calculating, please wait 5 seconds...")
-                start, end = games.alpha_beta_cutoff_search(state, game, d=self.depth)
-            elif algo == "ExpectimaxCutoff":
-                print("ExpectimaxCutoff calculating, please wait 5 seconds...")
-                start, end = games.expect_minmax(state, game, d=self.depth)
-
-            self.player1 = copy.deepcopy(savep1)
-            self.player2 = copy.deepcopy(savep2)
-
-            if player == "O":
-                curPlayer = self.player2
-            else:
-                curPlayer = self.player1
-
-            #  # find all possible moves for this player
-            if start == None or end == None:
-                print("!No more move possible for player ", player)
-                return
-
-            time.sleep(0.1)
+            start, end = piece_move
 
             # apply the move:
             if self.move(start, end, player) == True:
-
-                time.sleep(0.1)
                 curPlayer.poses.remove(start)
                 curPlayer.poses.append(end)
-                self.checkMillForPlayer(curPlayer, end)
+                self.checkMillForPlayer(curPlayer, end, capture)
 
 
 
@@ -452,13 +354,17 @@ class BoardGui(Frame):
         """ is used to step through the game. If Player1 is Human, then on_click is called when Human
         player clicks on an available spot. In case of AI vs AI playing, on_click is called as result
         of pressing 'next' button. """
+        if self.pending is not None or self.driver.busy():
+            return  # still waiting for player2 to answer the previous move
+
         x, y = self.getCoordinates(button)
 
         if self.player1.step == GameSteps[0]:
             if len(self.player1.poses) < self.player1.livePieces:  # means we are in phase 1 of the game still putting down new pieces
                 self.player1.poses.append((x, y))
-                button.config(text=self.to_move, state='disabled', disabledforeground="green")
-                print("Human onClick: button.text=", button['text'], "pos: ", x, ", ", y)
+                self.setCell((x, y), self.to_move)
+                button.config(state='disabled', disabledforeground="green")
+                print("Human onClick: button.text=", self.board[(x, y)], "pos: ", x, ", ", y)
                 self.checkMillForPlayer(self.player1, (x, y))
                 if len(self.player1.poses) == self.player1.livePieces:
                     self.player1.step = GameSteps[1]
@@ -482,19 +388,7 @@ class BoardGui(Frame):
                 print("Warning: to move a piece, click on one of your existing pieces!")
                 return
 
-        time.sleep(0.5)
-
-        if self.player2.type == PlayerType[1] and self.stop_flag != 1:
-            print("Random AI finding move for X.")
-            self.randomPlayerMove("O")
-        elif self.player2.type == PlayerType[2] and self.stop_flag != 1:
-            self.ai_move("O", "MinMax")
-        elif self.player2.type == PlayerType[3] and self.stop_flag != 1:
-            self.ai_move("O", "AlphaBeta")
-        elif self.player2.type == PlayerType[4] and self.stop_flag != 1:
-            self.ai_move("O", "AlphaBetaCutoff")
-        elif self.player2.type == PlayerType[5] and self.stop_flag != 1:
-            self.ai_move("O", "ExpectimaxCutoff")
+        self.schedule_player2()
 
 
     def randomPlayerMove(self, player):
@@ -514,8 +408,9 @@ class BoardGui(Frame):
                     print("!!ERROR! getButton returned null. Error")
                     return
 
-                button.config(text=player, state='disabled', disabledforeground="green")
-                print("randomPlayerMove: button.text=", button['text'], "pos: ", x, ", ", y)
+                self.setCell((x, y), player)
+                button.config(state='disabled', disabledforeground="green")
+                print("randomPlayerMove: button.text=", self.board[(x, y)], "pos: ", x, ", ", y)
                 self.checkMillForPlayer(curPlayer, (x, y))
                 if len(curPlayer.poses) == curPlayer.livePieces:
                     curPlayer.step = GameSteps[1]
@@ -538,75 +433,47 @@ class BoardGui(Frame):
                     self.checkMillForPlayer(curPlayer, end)
 
 
-    def checkMillForPlayer(self, player, pos):
+    def checkMillForPlayer(self, player, pos, capture=None):
         """check if a mill has happened for player as result of the latest move to pos, if so apply the result which is remove
-        a piece from the opponent."""
-        theNeigbors = self.neighborDict[pos]
-        mills = []
-        for next in theNeigbors:
-            #check if next, pos, are part of a mill:
-            if next in player.poses:
-                x1,y1 = pos
-                x2,y2 = next
-                dx, dy = x1-x2, y1-y2
-                x3,y3 = x2-dx, y2-dy
-                x4, y4 = x1+dx, y1+dy
-                if (x3,y3) in player.poses:
-                    newmill = {pos, next, (x3, y3)}
-                    if newmill not in mills:
-                        mills.append(newmill)
-                elif (x4, y4) in player.poses:
-                    newmill = {pos, next, (x4, y4)}
-                    if newmill not in mills:
-                        mills.append(newmill)
+        a piece from the opponent: capture, the piece the engine chose with its move, or one picked by remove_piece.
+        Closing two mills at once still removes one piece, as in the engine."""
+        mills = closed_mills(POINT_INDEX[pos], to_mask(player.poses))
 
         opponent = self.player1
         if opponent.sym == player.sym:
             opponent = self.player2
 
         for i in range(len(mills)):
-            print("Mill for ", player.sym, ": ", str(mills[i]))
-            pos2cull = self.remove_piece(opponent)
+            print("Mill for ", player.sym, ": ", str(set(to_poses(mills[i]))))
+
+        if mills and opponent.poses:
+            pos2cull = capture if capture is not None else self.remove_piece(opponent)
             print("culling ", str(pos2cull), " from player ", opponent.sym)
 
-            thebutton = self.getButton(pos2cull)
-            thebutton["text"] = ""
-            thebutton.config(state='normal')
+            self.setCell(pos2cull, "")
+            self.getButton(pos2cull).config(state='normal')
             opponent.poses.remove(pos2cull)
 
             opponent.livePieces -= 1
             self.checkStatus(opponent)
             self.player1Label["text"]="LivePieces_1:"+str(self.player1.livePieces)
             self.player2Label["text"]="LivePieces_2:"+str(self.player2.livePieces)
-            time.sleep(0.5)
 
     def remove_piece(self, opponent):
-        poses = opponent.poses
-
-        for x in poses:
-            theNeigbors = self.neighborDict[x]
+        """pick the opponent piece to remove after a mill: one that is not part of a mill, preferably next to
+        another of the opponent's pieces, and any piece if they are all in mills"""
+        opp = to_mask(opponent.poses)
+        free = to_poses(removable(opp))
 
-            for next in theNeigbors:
-                if next in opponent.poses:
-                    x1,y1 = x
-                    x2,y2 = next
-                    dx, dy = x1-x2, y1-y2
-                    x3,y3 = x2-dx, y2-dy
-                    x4, y4 = x1+dx, y1+dy
-                    if ((x3,y3) not in opponent.poses) and ((x4, y4) not in opponent.poses):
-                        return x
-                    else:
-                        continue
+        for x in free:
+            if NEIGHBOR_MASKS[POINT_INDEX[x]] & opp:
+                return x
 
-        return random.choice(opponent.poses)
+        return free[0]
 
     def randomFreePick(self):
         """Randomly pick a free position on the board"""
-        freeCells = []
-        for cellrow in self.cells:
-            for cell in cellrow:
-                if cell.button["text"] == "":
-                    freeCells.append(tuple(cell.pos))
+        freeCells = [pos for pos, sym in self.board.items() if sym == ""]
 
         aFreePos = random.choice(freeCells)
         a, b = aFreePos
@@ -621,24 +488,6 @@ class BoardGui(Frame):
 
 
 
-    def findPossibleMoves2(self, player):
-        """For player find all the pieces which can potentially move"""
-        moves = []
-
-        if player.sym == "X":
-            opponent = self.player2
-        else:
-            opponent = self.player1
-
-        for pos in player.poses:
-            possibleEnds = self.findPossibleEnds(player, pos)
-            if len(possibleEnds) > 0:
-                for x in range(len(possibleEnds)):
-                    if (possibleEnds[x] not in opponent.poses) and (possibleEnds[x] not in player.poses):
-                        moves.append((pos, possibleEnds[x]))
-
-        return moves
-
     def findPossibleMoves(self, player):
         """For player find all the pieces which can potentially move"""
         moves = {}   # a dictionary of start:[possible ends] which represent a start position as key, all possible end positions as value
@@ -655,8 +504,7 @@ class BoardGui(Frame):
         validEnds = []
         possibleEnds = self.neighborDict[pos]
         for end in possibleEnds:
-            button = self.getButton(end)
-            if button["text"] == "":
+            if self.board[end] == "":
                 validEnds.append(end)
 
         return validEnds
@@ -665,36 +513,27 @@ class BoardGui(Frame):
     def enablePlayerCells(self, poses):
         """go through all the cells occupied by positions in pos array and enable their buttons for clicking"""
         for pos in poses:
-            for row in self.cells:
-                for cell in row:
-                    if cell.pos == list(pos):
-                        cell.button.config(state='normal')
+            self.cellAt[pos].button.config(state='normal')
 
     def move(self, start, end, sym):
         """try to move a piece from start to end position"""
         print("move: ", sym, " from ", str(start), " to ", str(end))
-        x, y = start
-        a, b = end
-        for sCell in self.cells[x]:
-            if sCell.pos == list(start):
-                assert sCell.button["text"] == sym, "move: Error: start cell has wrong symbol"
-                for eCell in self.cells[a]:
-                    if eCell.pos == list(end):
-                        if eCell.button["text"] != "":
-                            print("move: end cell is not empty! Ignoring move request")
-                        elif self.isMoveLegal(start, end, sym):
-                            eCell.button["text"] = sCell.button["text"]
-                            sCell.button["text"] = ""
-                            sCell.button.config(state='normal')
-                            time.sleep(0.4)
-                            return True
-                        else:
-                            print("move: The move from ", str(start), " to ", str(end), " is not legal. Ignore the move request.")
-                            return False
-
-        print("!Failed to move successfully")
-
-        return False
+        if start not in self.board or end not in self.board:
+            print("!Failed to move successfully")
+            return False
+
+        assert self.board[start] == sym, "move: Error: start cell has wrong symbol"
+        if self.board[end] != "":
+            print("move: end cell is not empty! Ignoring move request")
+            return False
+        if not self.isMoveLegal(start, end, sym):
+            print("move: The move from ", str(start), " to ", str(end), " is not legal. Ignore the move request.")
+            return False
+
+        self.setCell(end, sym)
+        self.setCell(start, "")
+        self.cellAt[start].button.config(state='normal')
+        return True
 
     def isMoveLegal(self, start, end, sym):
         """ check to see if cells with pos start and end are neighbors or not"""
@@ -722,5 +561,17 @@ def initialize(nmm):
     root.mainloop()
 
 if __name__ == "__main__":
+    if "--fast" in sys.argv:
+        BoardGui.pace = 0
+    if "--workers" in sys.argv:
+        BoardGui.workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    if "--smp" in sys.argv:
+        BoardGui.parallel = 'smp'
     game = NMensMorris()
+    if os.path.isdir("tablebase"):
+        game.tablebase = Tablebase("tablebase")
+    if os.path.isfile("book.json"):
+        game.book = OpeningBook("book.json")
+    if os.path.isfile("weights.json"):
+        game.weights = load_weights("weights.json")
     initialize(game)
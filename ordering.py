@@ -0,0 +1,83 @@
+"""
+Move ordering for the alpha-beta searches in games.py. Alpha-beta prunes the most when the best move of a
+node is searched first, so moves are tried in this order:
+
+    1. the best move stored for the position in the transposition table
+    2. moves that close a mill
+    3. moves that block a mill the opponent could close
+    4. killer moves: moves that caused a cutoff in a sibling node at the same ply
+    5. the remaining moves, by their history score: how often and how deep they caused cutoffs before
+
+The moves of 2. and 3. are also the ones the quiescence search in games.py keeps searching past the cutoff
+depth, see mill_moves.
+"""
+
+from topology import forms_mill
+
+TT_MOVE = 1 << 30
+CLOSES_MILL = 1 << 29
+BLOCKS_MILL = 1 << 28
+KILLER = 1 << 27
+
+
+def mill_kind(state, move):
+    """CLOSES_MILL if move closes a mill for the side to move in state, BLOCKS_MILL if it takes a point the
+    opponent could close a mill on, else 0."""
+    start, end = move[0], move[1]
+    own, opp = state.pieces(state.to_move)
+    if start >= 0:
+        own &= ~(1 << start)
+    if forms_mill(end, own):
+        return CLOSES_MILL
+    if forms_mill(end, opp):
+        return BLOCKS_MILL
+    return 0
+
+
+def mill_moves(state, moves):
+    """The moves closing a mill, then the moves blocking one: the moves after which the static value of a
+    position is not to be trusted."""
+    closing = []
+    blocking = []
+    for move in moves:
+        kind = mill_kind(state, move)
+        if kind == CLOSES_MILL:
+            closing.append(move)
+        elif kind == BLOCKS_MILL:
+            blocking.append(move)
+    return closing + blocking
+
+
+class MoveOrderer:
+    """Killer moves and history scores collected during one search, and the ordering they give. Moves are
+    (start, end, captured) point indices on a BitboardState, start being -1 for a placement and captured
+    -1 for a move that does not capture."""
+
+    def __init__(self, max_ply=64):
+        self.killers = [[None, None] for _ in range(max_ply)]  # the two latest killer moves of each ply
+        self.history = {}  # (side, move): score
+
+    def score(self, state, move, ply, tt_move=None):
+        if move == tt_move:
+            return TT_MOVE
+        kind = mill_kind(state, move)
+        if kind:
+            return kind
+        if ply < len(self.killers) and move in self.killers[ply]:
+            return KILLER
+        return self.history.get((state.to_move, move), 0)
+
+    def order(self, state, moves, ply, tt_move=None):
+        """moves sorted best first for the side to move in state, ply plies below the root."""
+        return sorted(moves, key=lambda move: self.score(state, move, ply, tt_move), reverse=True)
+
+    def cutoff(self, state, move, ply, depth_left):
+        """Record that move, played by the side to move in state, caused a cutoff with depth_left plies
+        still to search below it."""
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        key = (state.to_move, move)
+        self.history[key] = self.history.get(key, 0) + depth_left * depth_left
@@ -0,0 +1,154 @@
+"""
+Headless self-play: plays a number of games between two AI player types and reports the wins, draws and
+losses of each, together with how long their moves took. Games are spread over a pool of processes.
+
+Example, 1000 games of AlphaBetaCutoff against Random on all cores, each engine playing X in half of them:
+
+    python selfplay.py AlphaBetaCutoff Random --games 1000 --swap --output results.json
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+
+from games import NMensMorris, BitboardState, PlayerType, engine_move
+from tablebase import Tablebase
+from book import OpeningBook
+from evaluation import load_weights
+
+GameTask = namedtuple('GameTask', 'index, x_type, o_type, depth, time_budget, node_limit, max_plies, seed, '
+                                  'tablebase, book, weights')
+
+
+@functools.lru_cache(maxsize=None)
+def load_tablebase(directory):
+    """The tablebase in directory, loaded once per process."""
+    return Tablebase(directory)
+
+
+@functools.lru_cache(maxsize=None)
+def load_book(path):
+    """The opening book in path, loaded once per process."""
+    return OpeningBook(path)
+
+
+def play_one(task):
+    """Play one game and return its record: the winner ('X', 'O' or None for a draw), the number of plies
+    and the time each move took as (sym, seconds) pairs."""
+    random.seed(task.seed)
+    game = NMensMorris()
+    if task.tablebase:
+        game.tablebase = load_tablebase(task.tablebase)
+    if task.book:
+        game.book = load_book(task.book)
+    if task.weights:
+        game.weights = load_weights(task.weights)
+    state = BitboardState()
+    timings = []
+    winner = None
+
+    while state.depth < task.max_plies:
+        loser = game.bitboard_loser(state)
+        if loser is not None:
+            winner = 'O' if loser == 'X' else 'X'
+            break
+
+        sym = state.to_move
+        player_type = task.x_type if sym == 'X' else task.o_type
+        start = time.perf_counter()
+        move = engine_move(player_type, game, state, d=task.depth, time_budget=task.time_budget,
+                           node_limit=task.node_limit)
+        timings.append((sym, time.perf_counter() - start))
+        game.make_move(state, move)
+
+    return {'index': task.index, 'x': task.x_type, 'o': task.o_type, 'winner': winner, 'plies': state.depth,
+            'timings': timings}
+
+
+def summarize(records, engines):
+    """Wins, draws and losses of each engine over records, and statistics of the time its moves took."""
+    summary = {}
+    for engine in engines:
+        stats = {'games': 0, 'wins': 0, 'draws': 0, 'losses': 0, 'moves': 0, 'mean_move_time': 0.0,
+                 'max_move_time': 0.0}
+        total_time = 0.0
+        for record in records:
+            for sym in ('X', 'O'):
+                if record[sym.lower()] != engine:
+                    continue
+                stats['games'] += 1
+                if record['winner'] is None:
+                    stats['draws'] += 1
+                elif record['winner'] == sym:
+                    stats['wins'] += 1
+                else:
+                    stats['losses'] += 1
+                for mover, seconds in record['timings']:
+                    if mover == sym:
+                        stats['moves'] += 1
+                        total_time += seconds
+                        stats['max_move_time'] = max(stats['max_move_time'], seconds)
+        if stats['moves']:
+            stats['mean_move_time'] = total_time / stats['moves']
+        summary[engine] = stats
+    return summary
+
+
+def run(engine_a, engine_b, n_games, swap=False, depth=-1, time_budget=5, node_limit=None, max_plies=200,
+        seed=0, workers=None, tablebase=None, book=None, weights=None):
+    """Play n_games games of engine_a as X against engine_b as O, alternating colors if swap, on a pool of
+    workers processes (all cores by default), AlphaBetaCutoff and PVS probing the tablebase in directory
+    tablebase and the searches playing from the opening book in file book and evaluating with the weights
+    in file weights if given. Return the summary and the record of every game."""
+    tasks = []
+    for i in range(n_games):
+        x_type, o_type = (engine_b, engine_a) if swap and i % 2 else (engine_a, engine_b)
+        tasks.append(GameTask(i, x_type, o_type, depth, time_budget, node_limit, max_plies, seed + i,
+                              tablebase, book, weights))
+
+    with multiprocessing.Pool(workers) as pool:
+        records = sorted(pool.imap_unordered(play_one, tasks), key=lambda record: record['index'])
+
+    return summarize(records, sorted({engine_a, engine_b})), records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Nine Men's Morris AI players against each other.")
+    parser.add_argument('engine_a', choices=PlayerType[1:], help="player type playing X (every game unless --swap)")
+    parser.add_argument('engine_b', choices=PlayerType[1:], help="player type playing O (every game unless --swap)")
+    parser.add_argument('--games', type=int, default=100, help="number of games to play")
+    parser.add_argument('--swap', action='store_true', help="alternate which engine plays X")
+    parser.add_argument('--depth', type=int, default=-1, help="cutoff depth of the cutoff searches")
+    parser.add_argument('--time', type=float, default=5, help="seconds per move of AlphaBetaCutoff and PVS")
+    parser.add_argument('--nodes', type=int, default=None, help="node limit per move of AlphaBetaCutoff and PVS")
+    parser.add_argument('--max-plies', type=int, default=200, help="plies after which a game is a draw")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the first game")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument('--tablebase', help="directory of an endgame tablebase for AlphaBetaCutoff and PVS to probe")
+    parser.add_argument('--book', help="opening book file for the searches to play from")
+    parser.add_argument('--weights', help="JSON file of evaluation weights for the searches, see tune.py")
+    parser.add_argument('--output', help="file to write the summary and per-move timings to, as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    summary, records = run(args.engine_a, args.engine_b, args.games, swap=args.swap, depth=args.depth,
+                           time_budget=args.time, node_limit=args.nodes, max_plies=args.max_plies,
+                           seed=args.seed, workers=args.workers, tablebase=args.tablebase, book=args.book,
+                           weights=args.weights)
+
+    print("{} games in {:.1f} s".format(args.games, time.time() - start))
+    for engine, stats in summary.items():
+        print("{:>16}: {wins} wins, {draws} draws, {losses} losses, {mean_move_time:.4f} s/move "
+              "(max {max_move_time:.4f} s)".format(engine, **stats))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'games': records}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Symmetries of the Nine Men's Morris board and canonical forms of positions.
+
+The board has 16 symmetries: the 8 rotations and reflections of the square, each with or without swapping
+the inner and outer squares. They map neighbors to neighbors and mills to mills, so positions that are
+images of each other have the same value and their best moves are images of each other. Searching, caching
+or storing only one orientation of each position, its canonical form, saves up to 16 times the work.
+
+Each symmetry is a permutation of the 24 points, and is applied to a bitboard with three precomputed tables,
+one per byte of the bitboard. The canonical form of a pair of bitboards is the image under the symmetry
+that makes the first one smallest, and then the second.
+"""
+
+from topology import POINTS, POINT_INDEX, bit_indices
+from transposition import zobrist_hash
+
+
+def _ring_swap(v):
+    """Coordinate v after swapping the inner and outer squares: 0, 1, 2 become 2, 1, 0 and 4, 5, 6 become
+    6, 5, 4."""
+    if v < 3:
+        return 2 - v
+    if v > 3:
+        return 10 - v
+    return v
+
+
+def _symmetry(rotations, mirror, swap_rings):
+    perm = []
+    for row, col in POINTS:
+        if swap_rings:
+            row, col = _ring_swap(row), _ring_swap(col)
+        if mirror:
+            col = 6 - col
+        for _ in range(rotations):
+            row, col = col, 6 - row
+        perm.append(POINT_INDEX[(row, col)])
+    return perm
+
+
+def _byte_tables(perm):
+    """Three tables mapping each byte of a bitboard to its image under perm."""
+    tables = []
+    for shift in (0, 8, 16):
+        table = []
+        for byte in range(256):
+            image = 0
+            for i in bit_indices(byte << shift):
+                image |= 1 << perm[i]
+            table.append(image)
+        tables.append(table)
+    return tables
+
+
+# SYMMETRIES[s][i] is where symmetry s takes POINTS[i]. SYMMETRIES[0] is the identity.
+SYMMETRIES = [_symmetry(r, m, s) for s in (False, True) for m in (False, True) for r in range(4)]
+# INVERSES[s] is the index of the symmetry undoing symmetry s
+INVERSES = [next(t for t, inverse in enumerate(SYMMETRIES) if all(inverse[p] == i for i, p in enumerate(perm)))
+            for perm in SYMMETRIES]
+BYTE_TABLES = [_byte_tables(perm) for perm in SYMMETRIES]
+
+
+def transform(bits, s):
+    """Image of a bitboard under symmetry s."""
+    t0, t1, t2 = BYTE_TABLES[s]
+    return t0[bits & 255] | t1[bits >> 8 & 255] | t2[bits >> 16]
+
+
+def transform_move(move, s):
+    """Image of a (start, end, captured) move under symmetry s. A start or captured of -1 stays -1."""
+    perm = SYMMETRIES[s]
+    start, end, captured = move
+    return (perm[start] if start >= 0 else -1), perm[end], (perm[captured] if captured >= 0 else -1)
+
+
+def canonical_symmetry(first, second):
+    """(s, first', second'): the symmetry s giving the canonical form of the pair of bitboards, and the
+    images first' and second' of first and second under it."""
+    best, best_first, best_second = 0, first, second
+    for s in range(1, len(BYTE_TABLES)):
+        t0, t1, t2 = BYTE_TABLES[s]
+        image = t0[first & 255] | t1[first >> 8 & 255] | t2[first >> 16]
+        if image > best_first:
+            continue
+        image_second = t0[second & 255] | t1[second >> 8 & 255] | t2[second >> 16]
+        if image < best_first or image_second < best_second:
+            best, best_first, best_second = s, image, image_second
+    return best, best_first, best_second
+
+
+def canonical(first, second):
+    """Canonical form of the pair of bitboards, as a pair of bitboards."""
+    return canonical_symmetry(first, second)[1:]
+
+
+def canonical_key(state):
+    """(key, s): the Zobrist hash of the canonical form of the position of a BitboardState, the same for
+    all its symmetric images, and the symmetry s taking state to its canonical form. Moves stored under the
+    key are in canonical orientation: transform_move(move, INVERSES[s]) turns them into moves of state."""
+    s, x_bits, o_bits = canonical_symmetry(state.x_bits, state.o_bits)
+    return zobrist_hash(state.to_move, x_bits, o_bits, state.x_hand, state.o_hand), s
@@ -0,0 +1,325 @@
+"""
+Endgame tablebase: the solved value of every position of the move phase (both sides have placed all their
+pieces) up to a number of pieces on the board, computed by retrograde analysis with the rules of
+games.NMensMorris, including flying: a side down to 3 pieces moves them to any empty point.
+
+Positions are grouped by subspace, (pieces of the side to move, pieces of the other side). A move keeps the
+numbers and hands the move to the other side, so subspaces (a, b) and (b, a) are solved together; a capture
+leads to (b - 1, a), which has fewer pieces and is solved before, or to a lost position once b - 1 < 3.
+
+Positions that are the same up to a symmetry of the board (symmetry.SYMMETRIES) have the same value and are
+stored once. SubspaceIndex numbers the positions of a subspace densely: the pieces of the side to move are
+brought to their canonical orientation and ranked among the canonical sets of a points, and the pieces of
+the other side are ranked among the sets of b of the 24 - a remaining points.
+
+Every position gets one byte, its value for the side to move:
+    0         draw
+    1..127    win, the game being won after that many plies
+    128 + n   loss after n plies (128: lost already, the side to move cannot move)
+
+Each subspace is stored as a file '<a>v<b>.tb' in the tablebase directory: a header, the canonical sets
+of a points as native 32-bit integers in increasing order, and the bytes of the positions by index. The
+Tablebase reader memory-maps the files, so opening a tablebase costs next to nothing, only the pages that
+are probed are read from disk, and processes probing the same tablebase share them in the page cache.
+
+To generate all subspaces with up to 7 pieces on the board:
+
+    python tablebase.py --max-total 7 --dir tablebase
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from itertools import combinations
+from math import comb
+
+from games import NMensMorris
+from symmetry import canonical
+from topology import POINTS, FULL_MASK, bit_indices, in_mill, popcount, removable
+
+WIN = 1
+LOSS = -1
+DRAW = 0
+
+LOSS_BASE = 128
+MAX_DISTANCE = 127  # longer distances are stored as MAX_DISTANCE
+CANNOT_LOSE = 255  # remaining count of a position with a move that does not lose
+
+MAGIC = b'NMMTB3'  # NMMTB2 files were solved without flying
+HEADER = struct.Struct('<6sBBII')  # magic, a, b, number of canonical sets, number of positions
+
+
+# ______________________________________________________________________________
+# Indexing
+
+
+def canonical_sets(a):
+    """The sets of a points that no symmetry makes smaller, in increasing order."""
+    sets = []
+    for points in combinations(range(len(POINTS)), a):
+        bits = sum(1 << i for i in points)
+        if canonical(bits, 0)[0] == bits:
+            sets.append(bits)
+    return sorted(sets)
+
+
+def rank_combination(bits):
+    """Rank of the set of points in bits among all the sets of the same size, in colexicographic order."""
+    rank = 0
+    k = 0
+    for i in bit_indices(bits):
+        k += 1
+        rank += comb(i, k)
+    return rank
+
+
+def squeeze(bits, holes):
+    """bits with the points of holes taken out of the board: every point above a hole moves down by one."""
+    for hole in reversed(bit_indices(holes)):
+        low = bits & ((1 << hole) - 1)
+        bits = low | (bits >> (hole + 1) << hole)
+    return bits
+
+
+class SubspaceIndex:
+    """Numbers the positions of subspace (a, b) from 0 to size - 1, a position and its symmetric images
+    getting the same number. owns is the increasing sequence of canonical sets of a points, as returned by
+    canonical_sets. Positions whose own pieces are symmetric leave a few numbers unused."""
+
+    def __init__(self, a, b, owns):
+        self.a = a
+        self.b = b
+        self.owns = owns
+        self.stride = comb(len(POINTS) - a, b)
+        self.size = len(owns) * self.stride
+
+    def index(self, own, opp):
+        own, opp = canonical(own, opp)
+        return bisect_left(self.owns, own) * self.stride + rank_combination(squeeze(opp, own))
+
+    def positions(self):
+        """(index, own, opp) of every canonical position of the subspace."""
+        points = range(len(POINTS))
+        for rank, own in enumerate(self.owns):
+            rest = [i for i in points if not own >> i & 1]
+            for opp_points in combinations(rest, self.b):
+                opp = sum(1 << i for i in opp_points)
+                if canonical(own, opp)[1] == opp:
+                    yield rank * self.stride + rank_combination(squeeze(opp, own)), own, opp
+
+
+class Subspace:
+    """The stored values of a subspace: its index and the bytes of its positions, starting at offset in
+    entries."""
+
+    def __init__(self, index, entries, offset=0):
+        self.index = index
+        self.entries = entries
+        self.offset = offset
+
+    def code(self, own, opp):
+        """The byte of the position with pieces own, to move, and opp."""
+        return self.entries[self.offset + self.index.index(own, opp)]
+
+
+def decode(code):
+    """(WIN, LOSS or DRAW, distance in plies) of a stored byte."""
+    if code == 0:
+        return DRAW, 0
+    if code >= LOSS_BASE:
+        return LOSS, code - LOSS_BASE
+    return WIN, code
+
+
+# ______________________________________________________________________________
+# Generation
+
+
+def solve_pair(game, a, b, solved):
+    """Solve subspaces (a, b) and (b, a) together. solved maps the subspaces with fewer pieces to their
+    Subspace. Return a dict mapping (a, b) and (b, a) to theirs.
+
+    The positions are linked by the moves between them. As a position stands for all its symmetric images,
+    the moves from a position that lead to images of the same position count as one, both in the forward
+    pass that counts the children of a position and in the backward pass that finds its parents."""
+    keys = [(a, b)] if a == b else [(a, b), (b, a)]
+    indexes = {key: SubspaceIndex(key[0], key[1], canonical_sets(key[0])) for key in keys}
+    values = {key: bytearray(indexes[key].size) for key in keys}
+    remaining = {key: bytearray(indexes[key].size) for key in keys}  # children not known to be won yet
+    longest = {key: bytearray(indexes[key].size) for key in keys}    # longest win among known children
+    # buckets[n]: (key, index, own, opp, code) to settle at n; the last one, MAX_DISTANCE, takes every longer
+    # distance too, and grows while it is processed
+    buckets = [[] for _ in range(MAX_DISTANCE + 1)]
+
+    # Forward pass: count the children inside the pair and settle what captures already decide.
+    for key in keys:
+        n_own, n_opp = key
+        child_index = indexes[(n_opp, n_own)]
+        for index, own, opp in indexes[key].positions():
+            empty = ~(own | opp) & FULL_MASK
+            children = set()  # indexes of the children inside the pair
+            captures = 0  # moves that capture
+            shortest_win = None  # shortest win through a capture
+            longest_loss = 0  # longest loss through a capture
+            captures_lose = True  # every capture leads to a lost position
+            for start in bit_indices(own):
+                for end in bit_indices(game.destinations(start, own, empty)):
+                    moved = own ^ (1 << start) ^ (1 << end)
+                    if not in_mill(end, moved):
+                        children.add(child_index.index(opp, moved))
+                        continue
+                    for captured in bit_indices(removable(opp)):
+                        captures += 1
+                        if n_opp - 1 < 3:
+                            result, distance = LOSS, 0
+                        else:
+                            result, distance = decode(solved[(n_opp - 1, n_own)].code(opp ^ (1 << captured), moved))
+                        if result == LOSS:
+                            if shortest_win is None or distance + 1 < shortest_win:
+                                shortest_win = distance + 1
+                        elif result == WIN:
+                            longest_loss = max(longest_loss, distance)
+                        else:
+                            captures_lose = False
+
+            if shortest_win is not None:
+                remaining[key][index] = CANNOT_LOSE
+                distance = min(shortest_win, MAX_DISTANCE)
+                buckets[distance].append((key, index, own, opp, distance))
+            elif not captures_lose:
+                remaining[key][index] = CANNOT_LOSE
+            elif not children:
+                # no move at all loses on the spot, otherwise every move is a capture that loses
+                distance = min(longest_loss + 1, MAX_DISTANCE) if captures else 0
+                buckets[distance].append((key, index, own, opp, LOSS_BASE + distance))
+            else:
+                remaining[key][index] = len(children)
+                longest[key][index] = longest_loss
+
+    # Backward pass: settle positions in order of distance, and the parents they decide. Positions decided
+    # beyond MAX_DISTANCE are settled in the last bucket, in no particular order of distance, which still
+    # gives them the right result.
+    for distance in range(len(buckets)):
+        for key, index, own, opp, code in buckets[distance]:
+            if values[key][index]:
+                continue
+            values[key][index] = code
+            parent_distance = min(distance + 1, MAX_DISTANCE)
+
+            # parents: the other side, to move, moved a piece onto one of its points without closing a mill
+            n_own, n_opp = key
+            parent_key = (n_opp, n_own)
+            parent_index = indexes[parent_key]
+            parents = {}
+            empty = ~(own | opp) & FULL_MASK
+            for end in bit_indices(opp):
+                if in_mill(end, opp):
+                    continue
+                for start in bit_indices(game.destinations(end, opp, empty)):
+                    parent_own = opp ^ (1 << end) ^ (1 << start)
+                    parents.setdefault(parent_index.index(parent_own, own), parent_own)
+
+            parent_values = values[parent_key]
+            parent_remaining = remaining[parent_key]
+            parent_longest = longest[parent_key]
+            for i, parent_own in parents.items():
+                if parent_values[i]:
+                    continue
+                if code >= LOSS_BASE:
+                    buckets[parent_distance].append((parent_key, i, parent_own, own, parent_distance))
+                elif parent_remaining[i] != CANNOT_LOSE:
+                    parent_remaining[i] -= 1
+                    parent_longest[i] = max(parent_longest[i], distance)
+                    if parent_remaining[i] == 0:
+                        loss = min(parent_longest[i] + 1, MAX_DISTANCE)
+                        buckets[loss].append((parent_key, i, parent_own, own, LOSS_BASE + loss))
+
+    return {key: Subspace(indexes[key], values[key]) for key in keys}
+
+
+def write_subspace(path, subspace):
+    index = subspace.index
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, index.a, index.b, len(index.owns), index.size))
+        f.write(array('I', index.owns).tobytes())
+        f.write(subspace.entries)
+
+
+def generate(directory, max_total=6, max_pieces=9, verbose=True):
+    """Solve every subspace with at least 3 and at most max_pieces pieces per side and at most max_total
+    pieces on the board, and write each to directory."""
+    game = NMensMorris()
+    os.makedirs(directory, exist_ok=True)
+    solved = {}
+    for total in range(6, max_total + 1):
+        for a in range(3, max_pieces + 1):
+            b = total - a
+            if b < 3 or b > max_pieces or b < a:
+                continue
+            start = time.time()
+            subspaces = solve_pair(game, a, b, solved)
+            for key, subspace in subspaces.items():
+                solved[key] = subspace
+                write_subspace(os.path.join(directory, '{}v{}.tb'.format(*key)), subspace)
+                if verbose:
+                    table = subspace.entries
+                    wins = sum(1 for code in table if 0 < code < LOSS_BASE)
+                    losses = sum(1 for code in table if code >= LOSS_BASE)
+                    print("{}v{}: {} entries, {} won, {} lost ({:.0f} s)".format(
+                        key[0], key[1], len(table), wins, losses, time.time() - start))
+    return solved
+
+
+# ______________________________________________________________________________
+# Probing
+
+
+class Tablebase:
+    """The subspaces found in a tablebase directory, memory-mapped read-only."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.subspaces = {}
+        for name in os.listdir(directory):
+            if not name.endswith('.tb'):
+                continue
+            with open(os.path.join(directory, name), 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, a, b, n_owns, size = HEADER.unpack_from(data)
+            if magic != MAGIC:
+                raise ValueError("Tablebase: " + name + " is not a tablebase file of this version, generate it again")
+            owns_end = HEADER.size + 4 * n_owns
+            owns = memoryview(data)[HEADER.size:owns_end].cast('I')
+            self.subspaces[(a, b)] = Subspace(SubspaceIndex(a, b, owns), data, owns_end)
+
+    def __reduce__(self):
+        # the maps cannot be pickled: another process opens the files again
+        return Tablebase, (self.directory,)
+
+    def probe(self, state):
+        """(WIN, LOSS or DRAW, distance in plies) of state for its side to move, or None when state is not
+        in the tablebase: pieces are still to be placed or its subspace was not generated."""
+        if state.x_hand or state.o_hand:
+            return None
+        own, opp = state.pieces(state.to_move)
+        subspace = self.subspaces.get((popcount(own), popcount(opp)))
+        if subspace is None:
+            return None
+        return decode(subspace.code(own, opp))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the Nine Men's Morris endgame tablebase.")
+    parser.add_argument('--dir', default='tablebase', help="directory to write the tables to")
+    parser.add_argument('--max-total', type=int, default=6, help="most pieces on the board, both sides")
+    parser.add_argument('--max-pieces', type=int, default=9, help="most pieces of one side")
+    args = parser.parse_args(argv)
+    generate(args.dir, args.max_total, args.max_pieces)
+
+
+if __name__ == "__main__":
+    main()
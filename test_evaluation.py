@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+from games import NMensMorris, BitboardState
+from evaluation import batch_utility, batch_features, state_features, linear_value, load_weights
+
+
+def random_positions(game, n, seed=0):
+    """n positions of random games, decided ones and flying sides included."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < n:
+        state = BitboardState()
+        while len(positions) < n:
+            positions.append(state.copy())
+            if game.terminal_test(state) or state.depth > 150:
+                break
+            game.make_move(state, rng.choice(game.actions(state)))
+    return positions
+
+
+def batch(positions):
+    return ([s.x_bits for s in positions], [s.o_bits for s in positions],
+            np.array([s.x_hand for s in positions]), np.array([s.o_hand for s in positions]),
+            np.array([s.to_move == 'X' for s in positions]))
+
+
+def test_batch_utility_matches_linear_value():
+    game = NMensMorris()
+    positions = random_positions(game, 3000)
+    for weights in (load_weights(), load_weights('weights.json'), [1.5, -0.25, 2, 0.75, -3]):
+        game.weights = weights
+        values = batch_utility(*batch(positions), weights)
+        for state, value in zip(positions, values):
+            if game.terminal_test(state):
+                assert value == game.utility(state, 'X')
+            else:
+                assert value == linear_value(state_features(state), weights)
+
+
+def test_batch_features_match_state_features():
+    positions = random_positions(NMensMorris(), 1000, seed=1)
+    features = batch_features(*batch(positions)[:4])
+    for state, row in zip(positions, features):
+        assert list(row) == state_features(state)
@@ -0,0 +1,53 @@
+import random
+
+from games import NMensMorris, NMMPlayer, BitboardState, GameState, random_player, alpha_beta_cutoff_search
+from topology import POINTS
+
+
+def cutoff_player(game, state):
+    return alpha_beta_cutoff_search(state, game, d=1, quiescence=0)
+
+
+def test_play_game_plays_to_the_end():
+    random.seed(0)
+    game = NMensMorris()
+    moves = []
+
+    def recording(player):
+        def play(game, state):
+            moves.append(player(game, state))
+            return moves[-1]
+        return play
+
+    utility = game.play_game(recording(cutoff_player), recording(random_player))
+
+    # the game ran well past the search horizon and ended in a win, not a heuristic score
+    assert len(moves) > 20
+    assert utility in (100, -100)
+    state = BitboardState()
+    for move in moves:
+        assert not game.terminal_test(state)
+        assert move in game.actions(state)
+        game.make_move(state, move)
+    assert game.terminal_test(state)
+    assert game.utility(state, 'X') == utility
+
+
+def test_display_bitboard_state(capsys):
+    game = NMensMorris()
+    state = game.result(game.initial, (-1, 0, -1))
+    game.display(state)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'X     .     .'
+    assert lines[1] == '  .   .   .'
+    assert lines[-1] == "to move: O, in hand: X 8, O 9"
+
+
+def test_result_on_a_game_state():
+    game = NMensMorris()
+    state = GameState(to_move='X', utility=0, board={}, moves=list(POINTS), player1=NMMPlayer(0, 'Human', 'X'),
+                      player2=NMMPlayer(1, 'Human', 'O'), depth=0)
+    state = game.result(state, (0, 0))
+    assert state.to_move == 'O'
+    assert state.player1.poses == [(0, 0)]
+    assert (0, 0) not in state.moves
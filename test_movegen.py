@@ -0,0 +1,67 @@
+import random
+
+from games import NMensMorris, BitboardState
+from evaluation import feature_counts
+from movegen import generate_moves, flies, MAX_MOVES
+from topology import POINTS, FULL_MASK, NEIGHBOR_MASKS, MILLS
+
+# the mills through each point
+MILLS_THROUGH = [[mill for mill in MILLS if p in mill] for p in range(len(POINTS))]
+
+
+def brute_force_moves(own, opp, hand):
+    """The legal moves of the side with pieces own and hand pieces in hand, from the rules alone: every
+    placement or step, and for a step completing one of MILLS each capture of a piece of opp outside a
+    mill, or of any piece if they all are in one."""
+    empty = [p for p in range(len(POINTS)) if not (own | opp) >> p & 1]
+    if hand > 0:
+        steps = [(-1, end) for end in empty]
+    else:
+        starts = [p for p in range(len(POINTS)) if own >> p & 1]
+        flying = len(starts) == 3
+        steps = [(start, end) for start in starts for end in empty if flying or NEIGHBOR_MASKS[start] >> end & 1]
+    opp_points = [p for p in range(len(POINTS)) if opp >> p & 1]
+    opp_milled = {p for mill in MILLS if all(opp >> q & 1 for q in mill) for p in mill}
+    captures = [p for p in opp_points if p not in opp_milled] or opp_points or [-1]
+    moves = []
+    for start, end in steps:
+        moved = own & ~(1 << start) | 1 << end if start >= 0 else own | 1 << end
+        if any(all(moved >> q & 1 for q in mill) for mill in MILLS_THROUGH[end]):
+            moves.extend((start, end, captured) for captured in captures)
+        else:
+            moves.append((start, end, -1))
+    return moves
+
+
+def fields(state):
+    return [getattr(state, name) for name in BitboardState.__slots__]
+
+
+def test_random_games():
+    # about 300 games and 21000 plies, checking the moves of every position, and undoing the move played and
+    # every capture
+    game = NMensMorris()
+    rng = random.Random(0)
+    out = [None] * MAX_MOVES
+    flying = 0
+    for _ in range(300):
+        state = BitboardState()
+        while not game.terminal_test(state) and state.depth < 150:
+            own, opp = state.pieces(state.to_move)
+            hand = state.hand(state.to_move)
+            flying += flies(own, hand)
+            expected = sorted(brute_force_moves(own, opp, hand))
+            moves = game.bitboard_actions(state)
+            assert sorted(moves) == expected
+            n = generate_moves(own, opp, hand, flies(own, hand), out)
+            assert sorted(out[:n]) == expected
+            assert state.features == feature_counts(state.x_bits, state.o_bits)
+            assert own & opp == 0 and (own | opp) & ~FULL_MASK == 0
+
+            before = fields(state)
+            move = rng.choice(moves)
+            for tried in [move] + [m for m in moves if m[2] >= 0]:
+                game.unmake_move(state, game.make_move(state, tried))
+                assert fields(state) == before
+            game.make_move(state, move)
+    assert flying
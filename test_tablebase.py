@@ -0,0 +1,15 @@
+import tablebase
+from games import NMensMorris
+from tablebase import solve_pair, decode, WIN, LOSS, DRAW, LOSS_BASE
+
+
+def test_solve_pair_propagates_past_max_distance(monkeypatch):
+    # with the default MAX_DISTANCE, 3v3 has 140621 wins, 28736 losses and 40783 draws; a smaller cap only
+    # clamps the distances, the results stay the same
+    monkeypatch.setattr(tablebase, 'MAX_DISTANCE', 5)
+    entries = solve_pair(NMensMorris(), 3, 3, {})[(3, 3)].entries
+    results = {WIN: 0, LOSS: 0, DRAW: 0}
+    for code in entries:
+        results[decode(code)[0]] += 1
+        assert code <= 5 or LOSS_BASE <= code <= LOSS_BASE + 5
+    assert results == {WIN: 140621, LOSS: 28736, DRAW: 40783}
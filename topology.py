@@ -0,0 +1,122 @@
+"""
+Board topology of Nine Men's Morris shared by the GUI (nMensMorrisGame.py) and the engine (games.py).
+
+The 24 points are numbered by their index in POINTS, and a set of points is a bitboard: an int with bit i
+set for every POINTS[i] in the set. Neighbors and mills are precomputed as bitboards so that adjacency and
+mill tests are a couple of mask operations.
+"""
+
+# The 24 points of the board as (row, col) pairs. A point's index in this list is its bit in a bitboard.
+POINTS = [(0, 0), (0, 3), (0, 6), (1, 1), (1, 3), (1, 5), (2, 2), (2, 3), (2, 4),
+          (3, 0), (3, 1), (3, 2), (3, 4), (3, 5), (3, 6), (4, 2), (4, 3), (4, 4), (5, 1), (5, 3),
+          (5, 5), (6, 0), (6, 3), (6, 6)]
+POINT_INDEX = {pos: i for i, pos in enumerate(POINTS)}
+FULL_MASK = (1 << len(POINTS)) - 1
+
+# the cells a piece can move to from each cell
+NEIGHBORS = {
+    # row 0
+    (0, 0): [(0, 3), (1, 1), (3, 0)],
+    (0, 3): [(0, 0), (0, 6), (1, 3)],
+    (0, 6): [(0, 3), (1, 5), (3, 6)],
+
+    # row 1
+    (1, 1): [(0, 0), (1, 3), (3, 1), (2, 2)],
+    (1, 3): [(0, 3), (1, 1), (1, 5), (2, 3)],
+    (1, 5): [(0, 6), (1, 3), (2, 4), (3, 5)],
+
+    # row 2
+    (2, 2): [(2, 3), (3, 2), (1, 1)],
+    (2, 3): [(2, 2), (1, 3), (2, 4)],
+    (2, 4): [(2, 3), (3, 4), (1, 5)],
+
+    # row 3
+    (3, 0): [(0, 0), (6, 0), (3, 1)],
+    (3, 1): [(3, 0), (3, 2), (1, 1), (5, 1)],
+    (3, 2): [(3, 1), (2, 2), (4, 2)],
+    (3, 4): [(3, 5), (2, 4), (4, 4)],
+    (3, 5): [(3, 4), (3, 6), (1, 5), (5, 5)],
+    (3, 6): [(3, 5), (0, 6), (6, 6)],
+
+    # row 4
+    (4, 2): [(4, 3), (3, 2), (5, 1)],
+    (4, 3): [(4, 2), (4, 4), (5, 3)],
+    (4, 4): [(4, 3), (3, 4), (5, 5)],
+
+    # row 5
+    (5, 1): [(6, 0), (5, 3), (3, 1), (4, 2)],
+    (5, 3): [(6, 3), (5, 1), (5, 5), (4, 3)],
+    (5, 5): [(6, 6), (5, 3), (4, 4), (3, 5)],
+
+    # row 6
+    (6, 0): [(6, 3), (5, 1), (3, 0)],
+    (6, 3): [(6, 0), (6, 6), (5, 3)],
+    (6, 6): [(6, 3), (5, 5), (3, 6)],
+}
+
+# NEIGHBOR_MASKS[i] is the bitboard of the points adjacent to POINTS[i]
+NEIGHBOR_MASKS = [sum(1 << POINT_INDEX[n] for n in NEIGHBORS[pos]) for pos in POINTS]
+
+# Every line of three points, given as point indices: the 8 rows first, then the 8 columns.
+MILLS = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (9, 10, 11), (12, 13, 14), (15, 16, 17), (18, 19, 20), (21, 22, 23),
+         (0, 9, 21), (3, 10, 18), (6, 11, 15), (1, 4, 7), (16, 19, 22), (8, 12, 17), (5, 13, 20), (2, 14, 23)]
+MILL_MASKS = [(1 << a) | (1 << b) | (1 << c) for a, b, c in MILLS]
+
+# POINT_MILLS[i] is the pair (row mill, column mill) of bitboards of the two mills POINTS[i] belongs to
+POINT_MILLS = [tuple(m for m in MILL_MASKS if m >> i & 1) for i in range(len(POINTS))]
+
+
+def popcount(bits):
+    """Number of set bits in a bitboard."""
+    return bin(bits).count("1")
+
+
+def bit_indices(bits):
+    """Indices of the set bits of a bitboard, lowest first."""
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+
+def to_mask(poses):
+    """Bitboard of a collection of (row, col) positions."""
+    bits = 0
+    for pos in poses:
+        bits |= 1 << POINT_INDEX[pos]
+    return bits
+
+
+def to_poses(bits):
+    """(row, col) positions of the points set in a bitboard."""
+    return [POINTS[i] for i in bit_indices(bits)]
+
+
+def forms_mill(point, side_mask):
+    """True if a piece arriving on point closes a mill together with the pieces in side_mask."""
+    row, col = POINT_MILLS[point]
+    side_mask |= 1 << point
+    return side_mask & row == row or side_mask & col == col
+
+
+def in_mill(point, side_mask):
+    """True if the piece on point is part of a complete mill of side_mask."""
+    row, col = POINT_MILLS[point]
+    return side_mask & row == row or side_mask & col == col
+
+
+def closed_mills(point, side_mask):
+    """The mills through point that are complete in side_mask, as bitboards."""
+    return [m for m in POINT_MILLS[point] if side_mask & m == m]
+
+
+def removable(side_mask):
+    """Bitboard of the pieces of side_mask a mill may capture: those that are not part of a complete mill,
+    or any of them if they all are."""
+    milled = 0
+    for m in MILL_MASKS:
+        if side_mask & m == m:
+            milled |= m
+    return side_mask & ~milled or side_mask
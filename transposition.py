@@ -0,0 +1,161 @@
+"""
+Zobrist hashing of Nine Men's Morris positions and a transposition table for the alpha-beta searches in
+games.py.
+
+A position's hash is the XOR of one random 64-bit key per occupied point and side, one key per side for
+the number of pieces it still has in hand (which also fixes the phase of the game), and a key for O to
+move. The keys of the points are XOR-ed a byte of a bitboard at a time from precomputed tables, so a hash
+takes a few lookups. The searches key their transposition table by the hash of the canonical form of the
+position, see symmetry.canonical_key.
+"""
+
+import random
+import struct
+from multiprocessing import shared_memory
+
+from topology import POINTS, bit_indices
+
+# Fixed seed, so that hashes are the same in every process and every run.
+_rng = random.Random(9)
+
+# ZOBRIST_POINTS[side][point], side 0 for X and 1 for O
+ZOBRIST_POINTS = [[_rng.getrandbits(64) for _ in POINTS] for _ in range(2)]
+# ZOBRIST_HAND[side][pieces in hand]
+ZOBRIST_HAND = [[_rng.getrandbits(64) for _ in range(10)] for _ in range(2)]
+ZOBRIST_O_TO_MOVE = _rng.getrandbits(64)
+
+
+def _byte_keys(keys, shift):
+    """Table of the XOR of keys[i] over the points i of each byte, shifted by shift, of a bitboard."""
+    table = []
+    for byte in range(256):
+        h = 0
+        for i in bit_indices(byte << shift):
+            h ^= keys[i]
+        table.append(h)
+    return table
+
+
+# ZOBRIST_BYTES[side][k][byte] is the XOR of ZOBRIST_POINTS[side] over the points of byte as byte k of a bitboard
+ZOBRIST_BYTES = [[_byte_keys(keys, shift) for shift in (0, 8, 16)] for keys in ZOBRIST_POINTS]
+
+
+def zobrist_hash(to_move, x_bits, o_bits, x_hand, o_hand):
+    """Hash of a position."""
+    x0, x1, x2 = ZOBRIST_BYTES[0]
+    o0, o1, o2 = ZOBRIST_BYTES[1]
+    h = ZOBRIST_HAND[0][x_hand] ^ ZOBRIST_HAND[1][o_hand] ^ \
+        x0[x_bits & 255] ^ x1[x_bits >> 8 & 255] ^ x2[x_bits >> 16] ^ \
+        o0[o_bits & 255] ^ o1[o_bits >> 8 & 255] ^ o2[o_bits >> 16]
+    if to_move == 'O':
+        h ^= ZOBRIST_O_TO_MOVE
+    return h
+
+
+# Kinds of scores stored in the table
+EXACT = 0       # the score is the value of the position
+LOWERBOUND = 1  # the search failed high, the value is at least the score
+UPPERBOUND = 2  # the search failed low, the value is at most the score
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results, indexed by the low bits of the position hash. Each slot
+    holds one entry (key, depth, score, flag, move), where depth is the remaining search depth the score
+    was computed with. A slot is overwritten by results for the same position, or by results of a search
+    at least as deep as the one stored."""
+
+    def __init__(self, size=1 << 18):
+        assert size & (size - 1) == 0, "TranspositionTable: size must be a power of 2"
+        self.mask = size - 1
+        self.entries = [None] * size
+
+    def probe(self, key):
+        """The entry stored for key, or None."""
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, flag, move)
+
+    def clear(self):
+        self.entries = [None] * (self.mask + 1)
+
+
+_SCORE = struct.Struct('<f')
+_SCORE_BITS = struct.Struct('<I')
+_NO_MOVE = 0x7FFF
+_USED = 1 << 31
+
+
+def _pack_move(move):
+    """15 bits of a (start, end, captured) move: start + 1, end and captured + 1, 5 bits each. None is
+    _NO_MOVE."""
+    if move is None:
+        return _NO_MOVE
+    start, end, captured = move
+    return (start + 1) << 10 | end << 5 | (captured + 1)
+
+
+def _unpack_move(bits):
+    if bits == _NO_MOVE:
+        return None
+    return (bits >> 10) - 1, bits >> 5 & 31, (bits & 31) - 1
+
+
+class SharedTranspositionTable:
+    """A TranspositionTable in a multiprocessing.shared_memory segment, so that several processes
+    searching at once share their results. Processes attach to the segment by name; a table pickles as
+    its name, so it can be handed to the workers of a pool as is.
+
+    Each slot is two 64-bit words, data and key ^ data, where data packs the depth, flag, move and the
+    score as a 32-bit float, and a bit set in every stored entry. Slots are read and written without locks:
+    a slot torn by two processes writing it at once no longer satisfies word0 ^ word1 == key, and reads as
+    empty."""
+
+    def __init__(self, size=1 << 18, name=None):
+        assert size & (size - 1) == 0, "SharedTranspositionTable: size must be a power of 2"
+        self.mask = size - 1
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=16 * size)
+        self.name = self.shm.name
+        self.words = self.shm.buf.cast('Q')
+        if self.owner:
+            self.clear()
+
+    def __reduce__(self):
+        return SharedTranspositionTable, (self.mask + 1, self.name)
+
+    def probe(self, key):
+        """The entry stored for key as (key, depth, score, flag, move), or None."""
+        i = (key & self.mask) << 1
+        data = self.words[i]
+        if not data & _USED or self.words[i + 1] ^ data != key:
+            return None
+        return (key, data >> 2 & 0xFF, _SCORE.unpack(_SCORE_BITS.pack(data >> 32))[0], data & 3,
+                _unpack_move(data >> 10 & _NO_MOVE))
+
+    def store(self, key, depth, score, flag, move):
+        i = (key & self.mask) << 1
+        old = self.words[i]
+        old_key = self.words[i + 1] ^ old
+        if old_key != key and old & _USED and depth < (old >> 2 & 0xFF):
+            return
+        data = _SCORE_BITS.unpack(_SCORE.pack(score))[0] << 32 | _USED | _pack_move(move) << 10 | \
+            min(depth, 0xFF) << 2 | flag
+        self.words[i] = data
+        self.words[i + 1] = key ^ data
+
+    def clear(self):
+        self.shm.buf[:] = bytes(len(self.shm.buf))
+
+    def close(self):
+        """Detach this process from the segment, and destroy it if this process created it."""
+        self.words.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,143 @@
+"""
+Texel tuning of the evaluation weights (evaluation.py) from self-play.
+
+Games of AlphaBetaCutoff against itself are played on a pool of processes, each starting with a few random
+plies for variety, and every quiet position of them, where the side to move has no capture, is recorded
+together with the result of its game. The weights are then fitted so that a logistic function of the static
+value of a position predicts the result of its game, by coordinate descent on the mean squared error. The
+features of all the positions are computed at once with evaluation.batch_features, so an evaluation of the
+error is a single matrix product. Every round plays its games with the weights found by the round before.
+
+Example, 3 rounds of 200 games searched 2 plies deep on all cores, starting from the weights in
+weights.json and writing the tuned ones back to it:
+
+    python tune.py --rounds 3 --games 200 --depth 2 --weights weights.json --output weights.json
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from games import NMensMorris, BitboardState, PlayerType, engine_move
+from evaluation import FEATURES, MAX_VALUE, batch_features, load_weights, save_weights
+
+TuneTask = namedtuple('TuneTask', 'weights, depth, time_budget, random_plies, max_plies, seed')
+
+
+def play_positions(task):
+    """Play one game of AlphaBetaCutoff against itself with the list of weights of the task, and return
+    (positions, result): its quiet positions as (x_bits, o_bits, x_hand, o_hand) tuples and its result for
+    X, 1 for a win, 0.5 for a draw and 0 for a loss."""
+    random.seed(task.seed)
+    game = NMensMorris()
+    game.weights = list(task.weights)
+    state = BitboardState()
+    positions = []
+    result = 0.5
+
+    while state.depth < task.max_plies:
+        loser = game.bitboard_loser(state)
+        if loser is not None:
+            result = 0.0 if loser == 'X' else 1.0
+            break
+        moves = game.bitboard_actions(state)
+        if state.depth < task.random_plies:
+            move = random.choice(moves)
+        else:
+            if all(captured < 0 for _, _, captured in moves):
+                positions.append((state.x_bits, state.o_bits, state.x_hand, state.o_hand))
+            move = engine_move(PlayerType[4], game, state, d=task.depth, time_budget=task.time_budget)
+        game.make_move(state, move)
+
+    return positions, result
+
+
+def self_play(weights, n_games, depth=2, time_budget=5, random_plies=4, max_plies=200, seed=0, workers=None):
+    """Play n_games games with the list of weights on a pool of workers processes (all cores by default),
+    and return (features, results): the batch_features of all their quiet positions and the result of the
+    game of each, for X."""
+    tasks = [TuneTask(weights, depth, time_budget, random_plies, max_plies, seed + i) for i in range(n_games)]
+    positions, results = [], []
+    with multiprocessing.Pool(workers) as pool:
+        for game_positions, result in pool.imap_unordered(play_positions, tasks):
+            positions.extend(game_positions)
+            results.extend([result] * len(game_positions))
+
+    if not positions:
+        return np.zeros((0, len(FEATURES))), np.zeros(0)
+    x_bits, o_bits, x_hand, o_hand = (np.array(column) for column in zip(*positions))
+    return batch_features(x_bits, o_bits, x_hand, o_hand), np.array(results)
+
+
+def mean_error(features, results, weights, scale):
+    """Mean squared error of the predicted results 1 / (1 + 10 ** (-value / scale)) of the positions, value
+    being the static value of each position with the list of weights."""
+    values = np.clip(features @ np.asarray(weights, dtype=float), -MAX_VALUE, MAX_VALUE)
+    predicted = 1 / (1 + 10 ** (-values / scale))
+    return float(np.mean((results - predicted) ** 2))
+
+
+def fit_scale(features, results, weights):
+    """The scale, from 1 to 100, with the least mean_error for the list of weights."""
+    scales = np.linspace(1, 100, 397)
+    return float(scales[np.argmin([mean_error(features, results, weights, scale) for scale in scales])])
+
+
+def tune(features, results, weights, scale, step=0.5, min_step=1 / 16, verbose=True):
+    """Coordinate descent of the mean_error: move each weight by +-step as long as that lowers the error,
+    then halve step, down to min_step. Return the tuned list of weights."""
+    weights = list(weights)
+    error = mean_error(features, results, weights, scale)
+    while step >= min_step:
+        improved = True
+        while improved:
+            improved = False
+            for i in range(len(weights)):
+                for delta in (step, -step):
+                    candidate = weights[:i] + [weights[i] + delta] + weights[i + 1:]
+                    candidate_error = mean_error(features, results, candidate, scale)
+                    if candidate_error < error:
+                        weights, error, improved = candidate, candidate_error, True
+                        break
+        if verbose:
+            print("  step {:.4f}: error {:.6f}".format(step, error))
+        step /= 2
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the evaluation weights by Texel tuning on self-play games.")
+    parser.add_argument('--rounds', type=int, default=3, help="rounds of self-play and tuning")
+    parser.add_argument('--games', type=int, default=200, help="games to play per round")
+    parser.add_argument('--depth', type=int, default=2, help="cutoff depth of the self-play searches")
+    parser.add_argument('--time', type=float, default=5, help="most seconds per self-play move")
+    parser.add_argument('--random-plies', type=int, default=4, help="random plies opening every game")
+    parser.add_argument('--max-plies', type=int, default=200, help="plies after which a game is a draw")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the first game")
+    parser.add_argument('--workers', type=int, default=None, help="number of processes, all cores by default")
+    parser.add_argument('--weights', help="JSON file of the weights to start from, the defaults if not given")
+    parser.add_argument('--output', default='weights.json', help="file to write the tuned weights to")
+    args = parser.parse_args(argv)
+
+    weights = load_weights(args.weights)
+    for round_index in range(args.rounds):
+        start = time.time()
+        features, results = self_play(weights, args.games, args.depth, args.time, args.random_plies,
+                                      args.max_plies, args.seed + round_index * args.games, args.workers)
+        print("round {}: {} positions from {} games in {:.1f} s".format(round_index + 1, len(results),
+                                                                        args.games, time.time() - start))
+        if not len(results):
+            continue
+        scale = fit_scale(features, results, weights)
+        weights = tune(features, results, weights, scale)
+        print("  scale {:.2f}, weights {}".format(scale, dict(zip(FEATURES, weights))))
+
+    save_weights(weights, args.output)
+
+
+if __name__ == "__main__":
+    main()